@@ -1,53 +1,407 @@
-from fastapi import APIRouter, Query
+import asyncio
+import hashlib
+import json
+import numpy as np
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from ..retrieval.lexical import LexicalRetriever
 from ..retrieval.semantic import SemanticRetriever
+from ..retrieval.numeric import NumericRetriever
 from ..retrieval.hybrid import HybridRetriever
-from ..core.context_builder import build_context, SYSTEM_PROMPT
-from ..core.llm import generate_answer
-from app.settings import TOP_K_LEXICAL, TOP_K_SEMANTIC
+from ..retrieval.vector_index import index_config
+from ..core.context_builder import build_context, context_fingerprint, SYSTEM_PROMPT
+from ..core.llm import generate_answer, stream_answer
+from ..core.llm_routing import route_query
+from ..core.fast_path import fast_path_answer
+from ..core.executor import run_in_pool
+from ..core.answer_cache import answer_cache
+from ..core.retrieval_cache import retrieval_cache, normalize_query
+from ..core.metrics import span, start_request_timings, start_request_usage, register_gauge, render_prometheus
+from ..ingestion.corpus import get_corpus
+from ..ingestion.embed_utils import cache_stats as embedding_cache_stats
+from app.settings import (
+    EMBED_MODEL, TOP_K_LEXICAL, TOP_K_SEMANTIC, FAQ_TOP_K, ANSWER_CACHE_ENABLED, RETRIEVAL_CACHE_ENABLED,
+    HYBRID_ALPHA, HYBRID_FUSION, HYBRID_LEXICAL_DEPTH, HYBRID_SEMANTIC_DEPTH, HYBRID_RRF_K,
+    RETRIEVE_MAX_DEPTH, BATCH_MAX_QUERIES, BATCH_LLM_CONCURRENCY,
+)
 
 
 router = APIRouter()
 
 
+# one instance of each retriever per process, all sharing the corpus registry
 _lex = LexicalRetriever()
 _sem = SemanticRetriever()
-_hybrid = HybridRetriever()
+_num = NumericRetriever()
+_hybrid = HybridRetriever(lex=_lex, sem=_sem, num=_num)
+
+# Everything a /retrieve response depends on besides its parameters; it only
+# changes when the corpus or retrieval config does, i.e. on redeploy.
+_RETRIEVAL_VERSION = hashlib.sha256(json.dumps({
+    "corpus": get_corpus().fingerprint,
+    "model": EMBED_MODEL,
+    "index": index_config(),
+    "analyzer": _lex.analyzer.config(),
+    "depth": [TOP_K_LEXICAL, TOP_K_SEMANTIC, FAQ_TOP_K, HYBRID_LEXICAL_DEPTH, HYBRID_SEMANTIC_DEPTH],
+    "fusion": [HYBRID_FUSION, HYBRID_ALPHA, HYBRID_RRF_K],
+}, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+RETRIEVE_FIELDS = ("id", "type", "score", "rank", "lex_score", "sem_score", "metric_value", "meta", "text")
+
+register_gauge("qonfido_embedding_cache", "Embedding disk cache counters", embedding_cache_stats, "stat")
+register_gauge("qonfido_answer_cache", "Semantic answer cache counters", answer_cache.stats, "stat")
+register_gauge("qonfido_retrieval_cache", "Retrieval result cache counters", retrieval_cache.stats, "stat")
 
 
 class QueryIn(BaseModel):
     query: str
     mode: Optional[str] = "hybrid" # lexical / semantic / hybrid
+    debug: Optional[bool] = False # include per-stage timings (ms) and LLM token usage in the response
+
+
+class QueryBatchIn(BaseModel):
+    items: List[QueryIn] # per-item debug is ignored; retrieval timings are shared by the batch
 
 
 class QueryOut(BaseModel):
     answer: str
     sources: list
     reasoning: Optional[dict] = None
+    served_by: str = "llm" # fast_path / cache / llm
+    timings: Optional[dict] = None
+    usage: Optional[dict] = None
+
+
+def _search(query: str, mode: str, k: int, q_emb=None):
+    if mode == "lexical":
+        return _lex.retrieve(query, top_k=k)
+    if mode == "semantic":
+        return _sem.retrieve(query, top_k=k, q_emb=q_emb)
+    if mode == "numeric":
+        return _num.retrieve(query, top_k=k)
+    return _hybrid.retrieve(query, top_k=k, q_emb=q_emb)
+
+
+def _cached_search(query: str, mode: str, k: int, q_emb=None):
+    if not RETRIEVAL_CACHE_ENABLED:
+        return _search(query, mode, k, q_emb)
+    with span("retrieval.cache"):
+        hit = retrieval_cache.get(mode, query, k, _RETRIEVAL_VERSION)
+    if hit is not None:
+        return hit
+    results = _search(normalize_query(query), mode, k, q_emb)
+    retrieval_cache.put(mode, query, k, _RETRIEVAL_VERSION, results)
+    return results
+
+
+def _query_mode(mode: str):
+    # /query retrieval mode and depth; anything else (incl. numeric) goes hybrid
+    if mode == "lexical":
+        return "lexical", TOP_K_LEXICAL
+    if mode == "semantic":
+        return "semantic", TOP_K_SEMANTIC
+    return "hybrid", max(TOP_K_LEXICAL, TOP_K_SEMANTIC)
+
+
+def _retrieve(query: str, mode: str, q_emb=None):
+    mode, k = _query_mode(mode)
+    return _cached_search(query, mode, k, q_emb)
+
+
+def _retrieve_with_embedding(query: str, mode: str):
+    # the query embedding feeds the answer cache and is shared with the
+    # semantic/hybrid search so the query is only embedded once
+    if not ANSWER_CACHE_ENABLED:
+        return _retrieve(query, mode), None
+    q_emb = _sem.embed_query(query)
+    return _retrieve(query, mode, q_emb=q_emb), q_emb
+
+
+def _retrieve_batch(queries: List[str], modes: List[str]):
+    # cached items are answered first; the rest get one embedding call for the
+    # whole batch, then one batched search per mode
+    n = len(queries)
+    retrieved = [None] * n
+    groups = {}
+    first_of, repeats = {}, []  # repeated (mode, k, query) items reuse the first one's results
+    for i in range(n):
+        mode, k = _query_mode(modes[i])
+        if RETRIEVAL_CACHE_ENABLED:
+            retrieved[i] = retrieval_cache.get(mode, queries[i], k, _RETRIEVAL_VERSION)
+            if retrieved[i] is None:
+                key = (mode, k, normalize_query(queries[i]))
+                if key in first_of:
+                    repeats.append((i, first_of[key]))
+                    continue
+                first_of[key] = i
+        if retrieved[i] is None:
+            groups.setdefault((mode, k), []).append(i)
+
+    q_embs = [None] * n
+    need_emb = [i for i in range(n) if ANSWER_CACHE_ENABLED or (retrieved[i] is None and modes[i] != "lexical")]
+    if need_emb:
+        embs = _sem.embed_queries([queries[i] for i in need_emb])
+        for row, i in enumerate(need_emb):
+            q_embs[i] = embs[row]
+
+    for (mode, k), idxs in groups.items():
+        batch = [normalize_query(queries[i]) if RETRIEVAL_CACHE_ENABLED else queries[i] for i in idxs]
+        if mode == "lexical":
+            results = _lex.retrieve_batch(batch, top_k=k)
+        elif mode == "semantic":
+            results = _sem.retrieve_batch(batch, top_k=k, q_embs=np.stack([q_embs[i] for i in idxs]))
+        else:
+            results = _hybrid.retrieve_batch(batch, top_k=k, q_embs=np.stack([q_embs[i] for i in idxs]))
+        for i, res in zip(idxs, results):
+            retrieved[i] = res
+            if RETRIEVAL_CACHE_ENABLED:
+                retrieval_cache.put(mode, queries[i], k, _RETRIEVAL_VERSION, res)
+    for i, first in repeats:
+        retrieved[i] = retrieved[first]
+
+    return retrieved, (q_embs if ANSWER_CACHE_ENABLED else [None] * n)
+
+
+def _fast_path(query: str, retrieved):
+    with span("query.fast_path"):
+        return fast_path_answer(query, retrieved, _num.matched_categories(query))
+
+
+def _cache_lookup(q_emb, retrieved):
+    if q_emb is None:
+        return None, None
+    with span("query.answer_cache"):
+        key = context_fingerprint(retrieved)
+        return answer_cache.lookup(q_emb, key, get_corpus().fingerprint), key
+
+
+def _cache_store(q_emb, key, answer):
+    if q_emb is not None and answer.get("answer"):
+        answer_cache.store(q_emb, key, get_corpus().fingerprint, answer)
+
+
+def _format_sources(retrieved: list) -> list:
+    return [ {"id": r["source"]["id"], "type": r["source"]["type"], "source_meta": r["source"].get("meta", {}), "source_text": r["text"], "score": r.get("score", 0.0)} for r in retrieved ]
+
+
+def _retrieve_row(r: dict, rank: int, fields) -> dict:
+    row = {
+        "id": r["source"]["id"],
+        "type": r["source"]["type"],
+        "score": r.get("score", 0.0),
+        "rank": rank,
+        "meta": r["source"].get("meta", {}),
+        "text": r["text"],
+    }
+    # sub-scores only exist for the retrievers that produce them
+    for key in ("lex_score", "sem_score", "metric_value"):
+        if key in r:
+            row[key] = r[key]
+    return {f: row[f] for f in fields if f in row}
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or any(t.removeprefix("W/") == etag for t in tags)
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 
 @router.post("/query", response_model=QueryOut)
 async def query_endpoint(payload: QueryIn):
     query = payload.query
     mode = payload.mode.lower() if payload.mode else "hybrid"
-    if mode == "lexical":
-        retrieved = _lex.retrieve(query, top_k=TOP_K_LEXICAL)
-    elif mode == "semantic":
-        retrieved = _sem.retrieve(query, top_k=TOP_K_SEMANTIC)
-    else:
-        retrieved = _hybrid.retrieve(query, top_k=max(TOP_K_LEXICAL, TOP_K_SEMANTIC))
-
+    timings = start_request_timings()
+    usage = start_request_usage()
 
-    context = build_context(query, retrieved)
-    llm_resp = generate_answer(SYSTEM_PROMPT, query, context)
+    with span("query.total"):
+        with span("query.retrieval"):
+            retrieved, q_emb = await run_in_pool(_retrieve_with_embedding, query, mode)
 
+        llm_resp, served_by = _fast_path(query, retrieved), "fast_path"
+        if llm_resp is None:
+            llm_resp, cache_key = _cache_lookup(q_emb, retrieved)
+            served_by = "cache"
+        if llm_resp is None:
+            route = route_query(query, retrieved)
+            with span("query.build_context"):
+                context = build_context(query, retrieved, model=route.model)
+            with span("query.llm"):
+                llm_resp = await generate_answer(SYSTEM_PROMPT, query, context, route=route)
+            served_by = "llm"
+            _cache_store(q_emb, cache_key, llm_resp)
 
-    print("retrieved: ", retrieved)
-    sources = [ {"id": r["source"]["id"], "type": r["source"]["type"], "source_meta": r["source"].get("meta", {}), "source_text": r["text"], "score": r.get("score", 0.0)} for r in retrieved ]
+    sources = _format_sources(retrieved)
     return {
     "answer": llm_resp["answer"],
     "sources": sources,
-    "reasoning": llm_resp.get("reasoning_details")
-    }
\ No newline at end of file
+    "reasoning": llm_resp.get("reasoning_details"),
+    "served_by": served_by,
+    "timings": timings if payload.debug else None,
+    "usage": usage if payload.debug else None,
+    }
+
+
+# Server-sent events: "sources" as soon as retrieval is done, then "reasoning"
+# and "token" deltas from the LLM, then "done" (or "error").
+@router.post("/query/stream")
+async def query_stream_endpoint(payload: QueryIn):
+    query = payload.query
+    mode = payload.mode.lower() if payload.mode else "hybrid"
+
+    async def events():
+        timings = start_request_timings()
+        usage = start_request_usage()
+
+        def done(served_by: str):
+            data = {"served_by": served_by}
+            if payload.debug:
+                data.update(timings=timings, usage=usage)
+            return _sse("done", data)
+
+        try:
+            with span("query.retrieval"):
+                retrieved, q_emb = await run_in_pool(_retrieve_with_embedding, query, mode)
+            yield _sse("sources", _format_sources(retrieved))
+
+            fast = _fast_path(query, retrieved)
+            if fast is not None:
+                yield _sse("token", {"text": fast["answer"]})
+                yield done("fast_path")
+                return
+
+            cached, cache_key = _cache_lookup(q_emb, retrieved)
+            if cached is not None:
+                if cached.get("reasoning_details"):
+                    yield _sse("reasoning", {"text": cached["reasoning_details"].get("text", "")})
+                yield _sse("token", {"text": cached["answer"]})
+                yield done("cache")
+                return
+
+            route = route_query(query, retrieved)
+            with span("query.build_context"):
+                context = build_context(query, retrieved, model=route.model)
+            answer, reasoning = [], []
+            async for kind, text in stream_answer(SYSTEM_PROMPT, query, context, route=route):
+                (answer if kind == "token" else reasoning).append(text)
+                yield _sse(kind, {"text": text})
+            _cache_store(q_emb, cache_key, {"answer": "".join(answer),
+                                            "reasoning_details": {"text": "".join(reasoning)} if reasoning else None})
+            yield done("llm")
+        except Exception as e:
+            yield _sse("error", {"detail": str(e), "status": getattr(e, "status", None),
+                                 "retry_after": getattr(e, "retry_after", None)})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# NDJSON, one line per item in completion order: {"index", "query", "answer",
+# "sources", "reasoning", "served_by"} or {"index", "query", "error"}.
+@router.post("/query/batch")
+async def query_batch_endpoint(payload: QueryBatchIn):
+    if len(payload.items) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_QUERIES} queries per batch.")
+    queries = [item.query for item in payload.items]
+    modes = [item.mode.lower() if item.mode else "hybrid" for item in payload.items]
+
+    async def lines():
+        start_request_timings()
+        try:
+            with span("batch.retrieval"):
+                retrieved, q_embs = await run_in_pool(_retrieve_batch, queries, modes)
+        except Exception as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+            return
+
+        llm_slots = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+
+        async def answer(i: int):
+            try:
+                llm_resp, served_by = _fast_path(queries[i], retrieved[i]), "fast_path"
+                if llm_resp is None:
+                    llm_resp, cache_key = _cache_lookup(q_embs[i], retrieved[i])
+                    served_by = "cache"
+                if llm_resp is None:
+                    route = route_query(queries[i], retrieved[i])
+                    context = build_context(queries[i], retrieved[i], model=route.model)
+                    async with llm_slots:
+                        with span("batch.llm"):
+                            llm_resp = await generate_answer(SYSTEM_PROMPT, queries[i], context, route=route)
+                    served_by = "llm"
+                    _cache_store(q_embs[i], cache_key, llm_resp)
+                return {
+                    "index": i,
+                    "query": queries[i],
+                    "answer": llm_resp["answer"],
+                    "sources": _format_sources(retrieved[i]),
+                    "reasoning": llm_resp.get("reasoning_details"),
+                    "served_by": served_by,
+                }
+            except Exception as e:
+                return {"index": i, "query": queries[i], "error": str(e)}
+
+        tasks = [asyncio.create_task(answer(i)) for i in range(len(queries))]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            # client went away: stop the remaining LLM calls
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+# Ranked sources without the LLM. The ETag covers the retrieval version and
+# every parameter, so an unchanged corpus answers If-None-Match with a 304
+# before any retrieval runs.
+@router.get("/retrieve")
+async def retrieve_endpoint(
+    q: str,
+    mode: str = Query("hybrid", pattern="^(lexical|semantic|hybrid|numeric)$"),
+    k: int = Query(10, ge=1, le=RETRIEVE_MAX_DEPTH),
+    offset: int = Query(0, ge=0),
+    fields: Optional[str] = None, # comma-separated subset of RETRIEVE_FIELDS
+    if_none_match: Optional[str] = Header(None),
+):
+    if offset + k > RETRIEVE_MAX_DEPTH:
+        raise HTTPException(status_code=400, detail=f"offset + k must be at most {RETRIEVE_MAX_DEPTH}.")
+    selected = RETRIEVE_FIELDS
+    if fields:
+        selected = tuple(f.strip() for f in fields.split(",") if f.strip())
+        unknown = [f for f in selected if f not in RETRIEVE_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    key = json.dumps([_RETRIEVAL_VERSION, q, mode, k, offset, selected])
+    etag = '"' + hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"} # cache, but revalidate
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    with span("retrieve.total"):
+        # one extra row tells whether another page exists
+        retrieved = await run_in_pool(_cached_search, q, mode, offset + k + 1)
+
+    page = retrieved[offset:offset + k]
+    return JSONResponse({
+        "query": q,
+        "mode": mode,
+        "offset": offset,
+        "k": k,
+        "has_more": len(retrieved) > offset + k,
+        "version": _RETRIEVAL_VERSION,
+        "results": [_retrieve_row(r, offset + i + 1, selected) for i, r in enumerate(page)],
+    }, headers=headers)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
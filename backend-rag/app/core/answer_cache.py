@@ -0,0 +1,80 @@
+import itertools
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Optional
+from app.settings import ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL, ANSWER_CACHE_SIMILARITY
+
+
+# LLM answers keyed on (unit-normalized query embedding, retrieved-context hash).
+# A lookup hits when an entry for the same context has a query embedding with
+# cosine similarity >= threshold, so near-duplicate phrasings share an answer.
+class AnswerCache:
+    def __init__(self, max_entries: int = ANSWER_CACHE_MAX_ENTRIES, ttl: float = ANSWER_CACHE_TTL,
+                 threshold: float = ANSWER_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()  # entry id -> (context hash, embedding, answer, stored at)
+        self._by_context: Dict[str, set] = {}
+        self._ids = itertools.count()
+        self._fingerprint = None
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def _remove(self, entry_id):
+        context_hash = self._entries.pop(entry_id)[0]
+        ids = self._by_context[context_hash]
+        ids.discard(entry_id)
+        if not ids:
+            del self._by_context[context_hash]
+
+    def _check_fingerprint(self, fingerprint: str):
+        if fingerprint != self._fingerprint:
+            if self._entries:
+                self._stats["invalidations"] += 1
+            self._entries.clear()
+            self._by_context.clear()
+            self._fingerprint = fingerprint
+
+    def lookup(self, q_emb: np.ndarray, context_hash: str, fingerprint: str) -> Optional[Dict]:
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            now = time.time()
+            best_id, best_sim = None, self.threshold
+            for entry_id in list(self._by_context.get(context_hash, ())):
+                _, emb, _, stored_at = self._entries[entry_id]
+                if now - stored_at > self.ttl:
+                    self._remove(entry_id)
+                    self._stats["expirations"] += 1
+                    continue
+                sim = float(np.dot(emb, q_emb))
+                if sim >= best_sim:
+                    best_id, best_sim = entry_id, sim
+
+            if best_id is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id][2]
+
+    def store(self, q_emb: np.ndarray, context_hash: str, fingerprint: str, answer: Dict):
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            entry_id = next(self._ids)
+            self._entries[entry_id] = (context_hash, np.array(q_emb, dtype=np.float32), answer, time.time())
+            self._by_context.setdefault(context_hash, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {**self._stats, "entries": len(self._entries),
+                    "hit_rate": self._stats["hits"] / lookups if lookups else 0.0}
+
+
+answer_cache = AnswerCache()
@@ -1,5 +1,15 @@
-from typing import List, Dict
-import re
+from typing import List, Dict, Optional
+import csv
+import hashlib
+import io
+import numpy as np
+from ..ingestion.corpus import get_corpus
+from app.settings import LLM_MODEL, CONTEXT_TOKENIZER, CONTEXT_TOKEN_BUDGETS, CONTEXT_TOKEN_BUDGET_DEFAULT
+
+try:
+    import tiktoken
+except ImportError:  # optional; token counts fall back to a chars/4 estimate
+    tiktoken = None
 
 SYSTEM_PROMPT = """
 You are Qonfido, a knowledgeable financial advisor helping investors make informed decisions about mutual funds.
@@ -92,54 +102,74 @@ Do: "An index fund essentially mirrors a market index like the Nifty 50 - it aut
 You're not just reporting data - you're interpreting it and making it actionable. Think like an advisor who cares about helping someone make a good decision, not a robot reading spreadsheet cells.
 """
 
-def parse_fund_from_text(text: str):
-    fid = re.search(r"Fund\s+(F\d+)", text)
-    fund_id = fid.group(1) if fid else ""
+def context_fingerprint(retrieved: List[Dict]) -> str:
+    # identifies the retrieved evidence independently of the query wording
+    h = hashlib.sha256()
+    for r in retrieved:
+        h.update(f"{r.get('source', {}).get('id', '')}\t{r.get('text', '')}\n".encode("utf-8"))
+    return h.hexdigest()
 
-    fname = re.search(rf"{fund_id}\s+(.*?)\s+in category", text) if fund_id else None
-    fund_name = fname.group(1) if fname else ""
 
-    cagr = re.search(r"CAGR of ([0-9.]+)%", text)
-    cagr_val = cagr.group(1) if cagr else ""
+_encoder = None
+_encoder_loaded = False
 
-    vol = re.search(r"volatility of ([0-9.]+)%", text)
-    vol_val = vol.group(1) if vol else ""
+def _get_encoder():
+    # tiktoken downloads its encoding on first use (a blocking HTTP request);
+    # the app loads it at startup via load_tokenizer() so that never happens
+    # on the event loop. Without it we estimate.
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        _encoder_loaded = True
+        if tiktoken is not None:
+            try:
+                _encoder = tiktoken.get_encoding(CONTEXT_TOKENIZER)
+            except Exception as e:
+                print(f"Warning: tokenizer {CONTEXT_TOKENIZER} unavailable, estimating tokens as chars/4: {e}")
+    return _encoder
 
-    sharpe = re.search(r"Sharpe ratio of ([0-9.]+)", text)
-    sharpe_val = sharpe.group(1) if sharpe else ""
 
-    return fund_id, fund_name, cagr_val, vol_val, sharpe_val
+def load_tokenizer():
+    _get_encoder()
 
 
-def build_context(query: str, retrieved: List[Dict], max_chars: int = 10000) -> str:
-    faq_rows = []
-    fund_rows = []
+def count_tokens(text: str) -> int:
+    encoder = _get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
 
-    for r in retrieved:
-        sid = r.get("source", {}).get("id", "unknown")
-        text = r.get("text", "").replace("\n", " ").strip()
 
-        is_faq = r["source"].get("type") == "faq" or sid.lower().startswith("faq")
-        is_fund = r["source"].get("type") == "fund" or sid.startswith("F")
+def token_budget(model: str = LLM_MODEL) -> int:
+    return CONTEXT_TOKEN_BUDGETS.get(model, CONTEXT_TOKEN_BUDGET_DEFAULT)
 
-        if is_faq:
-            question = r["source"]["meta"].get("question", "")
-            answer = text.split("?", 1)[-1].strip()
 
-            question = question.replace(",", "\\,")
-            answer = answer.replace(",", "\\,")
-            faq_rows.append(f"{sid},{question},{answer}")
-            continue
+def _csv_row(values) -> str:
+    # quotes only fields that need it (commas, quotes), as TOON/CSV readers expect
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="").writerow(values)
+    return buf.getvalue()
+
+
+def _clean(value) -> str:
+    if isinstance(value, (float, np.floating)):
+        return "" if value != value else str(value)  # NaN -> empty; numpy prints float32 as 12.4, not 12.3999996
+    return " ".join(str(value).split())
 
-        if is_fund:
-            fund_id, fund_name, cagr, vol, sharpe = parse_fund_from_text(text)
-            fund_name = fund_name.replace(",", "\\,")
-            fund_rows.append(f"{fund_id},{fund_name},{cagr},{vol},{sharpe}")
-            continue
 
-        fallback = text.replace(",", "\\,")
-        faq_rows.append(f"{sid},unknown,{fallback}")
+def _source_row(r: Dict, corpus):
+    # (block, row) built from the corpus columns rather than the display text
+    source = r.get("source", {})
+    sid = source.get("id", "unknown")
+    idx = corpus.positions.get(sid)
+    if idx is not None:
+        f = corpus.fields[idx]
+        if corpus.types[idx] == "faq":
+            return "faq", _csv_row([sid, _clean(f["question"]), _clean(f["answer"])])
+        return "fund", _csv_row([sid, _clean(f["fund_name"]), _clean(f["cagr"]), _clean(f["volatility"]), _clean(f["sharpe"])])
+    return "faq", _csv_row([sid, "unknown", _clean(r.get("text", ""))])
 
+
+def _context(query: str, faq_rows: List[str], fund_rows: List[str]) -> str:
     faq_block = (
         "──────────────── FAQ DATA ────────────────\n"
         f"faq[{len(faq_rows)}]{{id,question,answer}}:\n"
@@ -154,7 +184,7 @@ def build_context(query: str, retrieved: List[Dict], max_chars: int = 10000) ->
         + "\n\n"
     ) if fund_rows else ""
 
-    context = (
+    return (
         "The dataset below is structured in two sections: FAQ and FUNDS.\n\n"
         f"query{{text}}:\n{query}\n\n"
         "### TOON_FORMAT ###\n"
@@ -162,8 +192,33 @@ def build_context(query: str, retrieved: List[Dict], max_chars: int = 10000) ->
         + fund_block
     )
 
-    if len(context) > max_chars:
-        context = context[:max_chars] + "\n...[truncated]"
 
-    print("context: ", context)
-    return context
\ No newline at end of file
+def build_context(query: str, retrieved: List[Dict], model: str = LLM_MODEL, budget: Optional[int] = None) -> str:
+    # Sources are deduplicated by id (keeping the best score), then packed in
+    # score order while they fit the model's token budget; a row that does not
+    # fit is skipped whole, never cut.
+    corpus = get_corpus()
+    budget = budget if budget is not None else token_budget(model)
+
+    best = {}
+    for r in retrieved:
+        sid = r.get("source", {}).get("id", "unknown")
+        if sid not in best or r.get("score", 0.0) > best[sid].get("score", 0.0):
+            best[sid] = r
+    ranked = sorted(best.values(), key=lambda r: r.get("score", 0.0), reverse=True)
+
+    # block headers and the query cost the same whatever gets packed (row
+    # counts are at most len(ranked), so that is the upper bound)
+    n = len(ranked)
+    used = count_tokens(_context(query, [""] * n, [""] * n))
+
+    rows = {"faq": [], "fund": []}
+    for r in ranked:
+        block, row = _source_row(r, corpus)
+        cost = count_tokens(row + "\n")
+        if used + cost > budget:
+            continue
+        used += cost
+        rows[block].append(row)
+
+    return _context(query, rows["faq"], rows["fund"])
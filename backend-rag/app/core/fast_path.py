@@ -0,0 +1,74 @@
+import re
+from typing import Dict, List, Optional, Sequence
+from ..retrieval.intent import parse_intent
+from app.settings import FAST_PATH_ENABLED
+
+# metric -> (label, unit) as the answers print them
+METRIC_LABELS = {
+    "sharpe_ratio": ("Sharpe ratio", ""),
+    "cagr_3y": ("3-year CAGR", "%"),
+    "volatility": ("volatility", "%"),
+}
+
+OPERATOR_WORDS = {"gt": "above", "lt": "below", "gte": "at least", "lte": "at most"}
+
+# "lowest volatility fund" asks for one fund, "lowest volatility funds" for a list
+_SINGULAR_RE = re.compile(r"\bfund\b")
+_PLURAL_RE = re.compile(r"\bfunds\b")
+
+
+def _value(metric: str, value: float) -> str:
+    return f"{value:g}{METRIC_LABELS[metric][1]}"
+
+
+def _in_categories(categories: Sequence[str]) -> str:
+    if not categories:
+        return ""
+    return f" in the {' or '.join(categories)} categor{'ies' if len(categories) > 1 else 'y'}"
+
+
+def _thresholds(predicates) -> str:
+    parts = [f"{METRIC_LABELS[m][0]} {OPERATOR_WORDS[op]} {_value(m, v)}" for m, op, v in predicates if m in METRIC_LABELS]
+    return " and ".join(parts)
+
+
+def _singular(query: str) -> bool:
+    q = query.lower()
+    return _SINGULAR_RE.search(q) is not None and _PLURAL_RE.search(q) is None
+
+
+def fast_path_answer(query: str, retrieved: List[Dict], categories: Sequence[str] = ()) -> Optional[Dict]:
+    # A templated, cited answer straight from NumericRetriever's ranked rows,
+    # or None when the query needs the LLM (open-ended phrasing, several
+    # metrics, unclear sort direction, or no ranked rows to show). categories
+    # are the fund categories the retriever filtered to.
+    if not FAST_PATH_ENABLED:
+        return None
+    intent = parse_intent(query)
+    if not intent.is_plain_ranking or intent.metric not in METRIC_LABELS:
+        return None
+    rows = [r for r in retrieved if "metric_value" in r and r["source"]["meta"].get("metric") == intent.metric]
+    if not rows:
+        return None
+    if intent.k is None and _singular(query):
+        rows = rows[:1]
+
+    label = METRIC_LABELS[intent.metric][0]
+    direction = "lowest" if intent.ascending else "highest"
+    scope = _in_categories(categories)
+    thresholds = _thresholds(intent.predicates)
+    cited = ", ".join(r["source"]["id"] for r in rows)
+
+    if len(rows) == 1 and not (intent.k and intent.k > 1):
+        r = rows[0]
+        among = f", among those with {thresholds}," if thresholds else ""
+        answer = (f"The fund{scope} with the {direction} {label}{among} is {r['source']['meta']['fund_name']} "
+                  f"({r['source']['id']}) at {_value(intent.metric, r['metric_value'])}. (Source: {cited})")
+    else:
+        lines = [f"{r['rank']}. {r['source']['meta']['fund_name']} ({r['source']['id']}) - "
+                 f"{label} {_value(intent.metric, r['metric_value'])}" for r in rows]
+        shortfall = f" (only {len(rows)} match)" if intent.k and len(rows) < intent.k else ""
+        among = f" with {thresholds}" if thresholds else ""
+        answer = (f"Funds{scope}{among} ranked by {label}, {direction} first{shortfall}:\n"
+                  + "\n".join(lines) + f"\n\n(Source: {cited})")
+    return {"answer": answer, "reasoning_details": None}
@@ -1,48 +1,148 @@
 import os
-import requests
-from typing import Dict, Any
-from app.settings import OPENROUTER_BASE_URL, LLM_MODEL, MAX_TOKEN_OUTPUT
+import json
+import time
+import httpx
+from typing import Dict, Any, AsyncIterator, Optional, Tuple
+from app.core.metrics import span, observe_stage, record_usage
+from app.core.llm_routing import LLMRoute, get_route
+from app.core import llm_transport
+from app.settings import (
+    OPENROUTER_BASE_URL, LLM_MODEL, LLM_FALLBACK_MODELS,
+    LLM_TIMEOUT, LLM_MAX_CONNECTIONS, LLM_KEEPALIVE_EXPIRY, LLM_CACHE_CONTROL_MODELS,
+)
 
 OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY")
 
-def _call_openrouter(messages: list, reasoning: bool = True, temperature: float = 0.0) -> Dict[str, Any]:
+_client = None
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=OPENROUTER_BASE_URL,
+            headers={
+                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+                "HTTP-Referer": "https://qonfido-backend-rag.up.railway.app",
+                "X-Title": "Qonfido AI Project",
+            },
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def _reasoning(setting) -> Dict[str, Any]:
+    if isinstance(setting, str):
+        return {"effort": setting}
+    return {"enabled": bool(setting)}
+
+
+def _resolve_route(route: Optional[LLMRoute], reasoning: bool) -> LLMRoute:
+    # callers that do not route get the "default" route, reasoning off if asked
+    if route is None:
+        route = get_route("default")
+        if not reasoning:
+            route = LLMRoute("default", route.model, False, route.max_tokens)
+    return route
+
+
+def _build_payload(messages: list, route: LLMRoute, temperature: float) -> Dict[str, Any]:
     if not OPENROUTER_API_KEY:
         raise RuntimeError("OPENROUTER_API_KEY is not set in environment.")
-    url = f"{OPENROUTER_BASE_URL}/chat/completions"
-    headers = {
-    "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-    "HTTP-Referer": "https://qonfido-backend-rag.up.railway.app",
-    "X-Title": "Qonfido AI Project",
-    }
-    payload = {
-    "model": LLM_MODEL,
+    return {
+    "model": route.model,
     "messages": messages,
-    "max_tokens": MAX_TOKEN_OUTPUT,
-    "extra_body": {"reasoning": {"enabled": True}} if reasoning else {},
+    "max_tokens": route.max_tokens,
+    "reasoning": _reasoning(route.reasoning),
     "temperature": temperature,
+    "usage": {"include": True}, # token counts incl. cached / reasoning tokens
     }
-    resp = requests.post(url, headers=headers, json=payload, timeout=60)
-    try:
-        resp.raise_for_status()
-    except Exception as e:
-        raise RuntimeError(f"OpenRouter API error: {e} - {resp.text}")
-    return resp.json()
 
 
-def generate_answer(system_prompt: str, user_query: str, context: str, reasoning: bool = True, temperature: float = 0.0):
-    messages = [
-    {"role": "system", "content": system_prompt},
+def _system_message(system_prompt: str, model: str = LLM_MODEL) -> Dict[str, Any]:
+    # The static system prompt goes first and unchanged, so every call shares
+    # the same cacheable prefix; per-request text only ever follows it. Models
+    # without automatic prefix caching get an explicit breakpoint after it.
+    if model.startswith(LLM_CACHE_CONTROL_MODELS):
+        return {"role": "system", "content": [
+            {"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}},
+        ]}
+    return {"role": "system", "content": system_prompt}
+
+
+def _build_messages(system_prompt: str, user_query: str, context: str, model: str = LLM_MODEL) -> list:
+    return [
+    _system_message(system_prompt, model),
     {"role": "user", "content": f"Context: {context} Question: {user_query}"},
     ]
-    resp = _call_openrouter(messages=messages, reasoning=reasoning, temperature=temperature)
+
+
+def _models(route: LLMRoute) -> list:
+    # the routed model first, then the fallbacks in order
+    return [route.model, *LLM_FALLBACK_MODELS]
+
+
+async def _call_openrouter(messages: list, route: LLMRoute, temperature: float = 0.0) -> Dict[str, Any]:
+    payload = _build_payload(messages, route, temperature)
+    with span("llm.openrouter"), span(f"llm.route.{route.name}"):
+        data = await llm_transport.complete(_get_client(), payload, _models(route), key=route.name)
+    record_usage(data.get("usage"))
+    return data
+
+
+async def generate_answer(system_prompt: str, user_query: str, context: str, reasoning: bool = True, temperature: float = 0.0,
+                          route: Optional[LLMRoute] = None):
+    route = _resolve_route(route, reasoning)
+    messages = _build_messages(system_prompt, user_query, context, route.model)
+    resp = await _call_openrouter(messages=messages, route=route, temperature=temperature)
     choice = resp.get("choices", [None])[0]
     if not choice:
         raise RuntimeError(f"No choices returned from OpenRouter: {resp}")
     message = choice.get("message", {})
     assistant_text = message.get("content")
     reasoning_details = message.get("reasoning_details")
+    return {"answer": assistant_text, "reasoning_details": reasoning_details[0] if isinstance(reasoning_details, list) else reasoning_details}
+
 
-    print("\nmessage: ", message)
-    print("\nassistant_text: ", assistant_text)
-    print("\nreasoning_details: ", reasoning_details)
-    return {"answer": assistant_text, "reasoning_details": reasoning_details[0] if isinstance(reasoning_details, list) else reasoning_details}
\ No newline at end of file
+async def stream_answer(system_prompt: str, user_query: str, context: str, reasoning: bool = True,
+                        temperature: float = 0.0, route: Optional[LLMRoute] = None) -> AsyncIterator[Tuple[str, str]]:
+    # yields ("reasoning", text) and ("token", text) deltas as OpenRouter sends them
+    route = _resolve_route(route, reasoning)
+    payload = _build_payload(_build_messages(system_prompt, user_query, context, route.model), route, temperature)
+    payload["stream"] = True
+    start = time.perf_counter()
+    async with llm_transport.stream(_get_client(), payload, _models(route)) as resp:
+        # time to response headers (incl. retries), i.e. until the first
+        # streamed byte can arrive
+        observe_stage("llm.openrouter_ttfb", time.perf_counter() - start)
+        async for line in resp.aiter_lines():
+            # blank lines separate events; ":" lines are keep-alive comments
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            record_usage(chunk.get("usage"))
+            if "error" in chunk:
+                raise RuntimeError(f"OpenRouter stream error: {chunk['error']}")
+            choices = chunk.get("choices") or []
+            if not choices:
+                continue
+            delta = choices[0].get("delta", {})
+            if delta.get("reasoning"):
+                yield "reasoning", delta["reasoning"]
+            if delta.get("content"):
+                yield "token", delta["content"]
+    elapsed = time.perf_counter() - start
+    observe_stage("llm.openrouter_stream", elapsed)
+    observe_stage(f"llm.route.{route.name}", elapsed)
@@ -0,0 +1,38 @@
+from dataclasses import dataclass
+from typing import Dict, List, Union
+from ..retrieval.intent import parse_intent
+from app.settings import LLM_ROUTING_ENABLED, LLM_ROUTES, LLM_ROUTE_COMPARISON_MIN_FUNDS
+
+
+@dataclass(frozen=True)
+class LLMRoute:
+    name: str
+    model: str
+    reasoning: Union[bool, str]  # True / False / effort level
+    max_tokens: int
+
+
+def get_route(name: str) -> LLMRoute:
+    return LLMRoute(name=name, **LLM_ROUTES[name])
+
+
+def _route_name(query: str, retrieved: List[Dict]) -> str:
+    if not retrieved:
+        return "no_context"
+    intent = parse_intent(query)  # cached; the retrievers already parsed it
+    n_funds = sum(r["source"]["type"] == "fund" for r in retrieved)
+    if intent.is_numeric:
+        return "comparison" if n_funds >= LLM_ROUTE_COMPARISON_MIN_FUNDS else "numeric"
+    # "define sharpe", or a question only FAQs answer ("what is an index
+    # fund"); with funds in the context it may be advice, which needs them
+    if intent.is_definition or n_funds == 0:
+        return "definition"
+    return "general"
+
+
+def route_query(query: str, retrieved: List[Dict]) -> LLMRoute:
+    # same signals the retrievers route on: numeric intent, definition intent,
+    # and how many sources came back
+    if not LLM_ROUTING_ENABLED:
+        return get_route("default")
+    return get_route(_route_name(query, retrieved))
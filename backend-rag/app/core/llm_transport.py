@@ -0,0 +1,307 @@
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+import httpx
+from app.core.metrics import LLM_ATTEMPTS, register_gauge
+from app.settings import (
+    LLM_MAX_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX, LLM_RETRY_AFTER_MAX,
+    LLM_HEDGE_ENABLED, LLM_HEDGE_QUANTILE, LLM_HEDGE_MIN_DELAY, LLM_HEDGE_MIN_SAMPLES, LLM_HEDGE_WINDOW,
+    LLM_BREAKER_WINDOW, LLM_BREAKER_MIN_ATTEMPTS, LLM_BREAKER_FAILURE_RATE, LLM_BREAKER_COOLDOWN,
+)
+
+# Retries, hedging, per-model circuit breakers and model fallback around the
+# OpenRouter /chat/completions call. Each model in the list gets up to
+# LLM_MAX_RETRIES retries with jittered exponential backoff (or the provider's
+# Retry-After); when they are used up, or the model's circuit is open, the next
+# model is tried. Client errors (400, 401, ...) are not retried, and count as
+# the provider being up.
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = (httpx.TimeoutException, httpx.TransportError)
+
+
+class LLMUnavailableError(RuntimeError):
+    # every model failed or was skipped; status is what the API should answer
+    # with (429 when the provider was rate limiting us, else 503)
+    def __init__(self, message: str, status: int = 503, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    # Opens when at least LLM_BREAKER_FAILURE_RATE of the model's recent
+    # attempts failed, so a flaky provider keeps being retried but a down one
+    # is skipped. After the cooldown one probe is let through (half-open); its
+    # outcome closes or reopens the circuit.
+    def __init__(self, window: int = LLM_BREAKER_WINDOW, min_attempts: int = LLM_BREAKER_MIN_ATTEMPTS,
+                 failure_rate: float = LLM_BREAKER_FAILURE_RATE, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.outcomes = deque(maxlen=window)  # True for a failed attempt
+        self.min_attempts = min_attempts
+        self.failure_rate = failure_rate
+        self.cooldown = cooldown
+        self.is_open = False
+        self.opened_at = 0.0
+        self.probing = False
+        self.rate_limited = False  # the last failure was a 429
+
+    def retry_in(self) -> float:
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic()) if self.is_open else 0.0
+
+    def allow(self) -> bool:
+        if not self.is_open:
+            return True
+        if self.probing or self.retry_in() > 0:
+            return False
+        self.probing = True
+        return True
+
+    def record_success(self):
+        if self.is_open:
+            self.outcomes.clear()
+        self.outcomes.append(False)
+        self.is_open = self.probing = False
+
+    def release(self):
+        # a probe that ended without an outcome (cancelled, raised) must not
+        # keep the circuit half-open forever; the next request probes again.
+        # Only the request that was let through as the probe may call this.
+        self.probing = False
+
+    def record_failure(self, rate_limited: bool = False):
+        self.rate_limited = rate_limited
+        self.outcomes.append(True)
+        failed = sum(self.outcomes)
+        if self.probing or (len(self.outcomes) >= self.min_attempts and failed >= self.failure_rate * len(self.outcomes)):
+            self.is_open = True
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_latencies: Dict[str, deque] = {}
+
+
+def _breaker(model: str) -> CircuitBreaker:
+    if model not in _breakers:
+        _breakers[model] = CircuitBreaker()
+    return _breakers[model]
+
+
+def breaker_states() -> Dict[str, float]:
+    return {model: float(b.is_open) for model, b in _breakers.items()}
+
+
+register_gauge("qonfido_llm_circuit_open", "1 while a model's circuit breaker is open", breaker_states, "model")
+
+
+def _record_latency(key: str, seconds: float):
+    if key not in _latencies:
+        _latencies[key] = deque(maxlen=LLM_HEDGE_WINDOW)
+    _latencies[key].append(seconds)
+
+
+def _hedge_delay(key: str) -> Optional[float]:
+    samples = _latencies.get(key)
+    if not LLM_HEDGE_ENABLED or not samples or len(samples) < LLM_HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    return max(LLM_HEDGE_MIN_DELAY, ordered[min(len(ordered) - 1, int(LLM_HEDGE_QUANTILE * len(ordered)))])
+
+
+def _retry_after(resp: httpx.Response) -> Optional[float]:
+    value = resp.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt: int, retry_after: Optional[float]) -> float:
+    # "full jitter": spreads the retries of concurrent requests apart
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+    return max(delay, retry_after or 0.0)
+
+
+async def _hedged(client: httpx.AsyncClient, payload: Dict[str, Any], key: str) -> httpx.Response:
+    # one attempt; if it outlives the recent p95 a second copy races it and the
+    # first good response wins
+    first = asyncio.create_task(client.post("/chat/completions", json=payload))
+    pending = {first}
+    try:
+        delay = _hedge_delay(key)
+        if delay is None:
+            return await first
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        LLM_ATTEMPTS.inc(model=payload["model"], outcome="hedge")
+        pending.add(asyncio.create_task(client.post("/chat/completions", json=payload)))
+        last = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                last = task
+                if task.exception() is None and task.result().status_code not in RETRYABLE_STATUS:
+                    return task.result()
+        return last.result()  # both failed: surface the last failure
+    finally:
+        # also on cancellation of the caller: no upstream request outlives it
+        for task in pending:
+            task.cancel()
+
+
+class _Attempts:
+    # walks the models and their retries, tracking why each one gave up
+    def __init__(self, models: List[str]):
+        self.models = list(dict.fromkeys(models))
+        self.probes = set()  # models whose half-open probe this request holds
+        self.errors = []
+        self.rate_limited = False
+        self.retry_after = None
+
+    def _wait(self, seconds: Optional[float]):
+        if seconds is not None:
+            self.retry_after = seconds if self.retry_after is None else min(self.retry_after, seconds)
+
+    def allow(self, model: str) -> bool:
+        breaker = _breaker(model)
+        was_open = breaker.is_open
+        if not breaker.allow():
+            return False
+        if was_open:  # an open breaker only says yes to its one probe
+            self.probes.add(model)
+        return True
+
+    def success(self, model: str):
+        _breaker(model).record_success()
+        self.probes.discard(model)  # the probe has its outcome
+
+    def release(self, model: str):
+        if model in self.probes:
+            self.probes.discard(model)
+            _breaker(model).release()
+
+    def failure(self, model: str, attempt: int, reason: str, status: Optional[int] = None,
+                retry_after: Optional[float] = None) -> Optional[float]:
+        # records a failed attempt; returns the delay before retrying this
+        # model, or None to move on to the next one
+        breaker = _breaker(model)
+        breaker.record_failure(rate_limited=status == 429)
+        self.probes.discard(model)
+        self.rate_limited |= status == 429
+        self._wait(retry_after)
+        delay = _backoff(attempt, retry_after)
+        if attempt >= LLM_MAX_RETRIES or delay > LLM_RETRY_AFTER_MAX or not self.allow(model):
+            LLM_ATTEMPTS.inc(model=model, outcome="error")
+            self.errors.append(f"{model}: {reason}")
+            if breaker.is_open:
+                self._wait(breaker.retry_in())
+            return None
+        LLM_ATTEMPTS.inc(model=model, outcome="retry")
+        return delay
+
+    def skip(self, model: str):
+        breaker = _breaker(model)
+        LLM_ATTEMPTS.inc(model=model, outcome="circuit_open")
+        self.errors.append(f"{model}: circuit open")
+        self.rate_limited |= breaker.rate_limited
+        self._wait(breaker.retry_in())
+
+    def give_up(self) -> LLMUnavailableError:
+        return LLMUnavailableError("OpenRouter API error: " + "; ".join(self.errors),
+                                   status=429 if self.rate_limited else 503, retry_after=self.retry_after)
+
+
+def _client_error(resp: httpx.Response, body: str) -> RuntimeError:
+    return RuntimeError(f"OpenRouter API error: {resp.status_code} - {body}")
+
+
+async def complete(client: httpx.AsyncClient, payload: Dict[str, Any], models: List[str], key: str = "") -> Dict[str, Any]:
+    # POST /chat/completions for payload, trying models in order
+    attempts = _Attempts(models)
+    for model in attempts.models:
+        if not attempts.allow(model):
+            attempts.skip(model)
+            continue
+        body = {**payload, "model": model}
+        hedge_key = f"{key}:{model}"
+        try:
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                start = time.perf_counter()
+                try:
+                    resp = await _hedged(client, body, hedge_key)
+                except RETRYABLE_ERRORS as e:
+                    delay = attempts.failure(model, attempt, f"{type(e).__name__} {e}")
+                else:
+                    if resp.status_code < 400:
+                        attempts.success(model)
+                        _record_latency(hedge_key, time.perf_counter() - start)
+                        LLM_ATTEMPTS.inc(model=model, outcome="ok")
+                        return resp.json()
+                    if resp.status_code not in RETRYABLE_STATUS:
+                        attempts.success(model)  # the provider answered; the request was bad
+                        raise _client_error(resp, resp.text)
+                    delay = attempts.failure(model, attempt, f"{resp.status_code} - {resp.text[:200]}",
+                                             resp.status_code, _retry_after(resp))
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+        finally:
+            attempts.release(model)
+    raise attempts.give_up()
+
+
+@asynccontextmanager
+async def stream(client: httpx.AsyncClient, payload: Dict[str, Any], models: List[str]) -> AsyncIterator[httpx.Response]:
+    # Same retries and fallback for a streamed request, up to the response
+    # headers; once the body starts flowing it is the caller's. Not hedged:
+    # the first tokens are already on their way to the user.
+    attempts = _Attempts(models)
+    for model in attempts.models:
+        if not attempts.allow(model):
+            attempts.skip(model)
+            continue
+        body = {**payload, "model": model}
+        try:
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                request = client.stream("POST", "/chat/completions", json=body)
+                try:
+                    resp = await request.__aenter__()
+                except RETRYABLE_ERRORS as e:
+                    delay = attempts.failure(model, attempt, f"{type(e).__name__} {e}")
+                else:
+                    if resp.status_code < 400:
+                        attempts.success(model)
+                        LLM_ATTEMPTS.inc(model=model, outcome="ok")
+                        try:
+                            yield resp
+                        finally:
+                            await request.__aexit__(None, None, None)
+                        return
+                    try:
+                        text = (await resp.aread()).decode("utf-8", "replace")
+                    finally:
+                        await request.__aexit__(None, None, None)
+                    if resp.status_code not in RETRYABLE_STATUS:
+                        attempts.success(model)  # the provider answered; the request was bad
+                        raise _client_error(resp, text)
+                    delay = attempts.failure(model, attempt, f"{resp.status_code} - {text[:200]}",
+                                             resp.status_code, _retry_after(resp))
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+        finally:
+            attempts.release(model)
+    raise attempts.give_up()
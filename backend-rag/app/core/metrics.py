@@ -0,0 +1,167 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+_gauges = []
+_lock = threading.Lock()
+
+
+def _label_str(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        _registry.append(self)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[n]) for n in self.labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_label_str(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, tuple(buckets)
+        self._series: Dict[Tuple[str, ...], list] = {}  # label values -> [bucket counts..., sum, count]
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[n]) for n in self.labels)
+        with _lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            i = bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self._series.items()):
+            labels = _label_str(self.labels, key)
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = _label_str(self.labels, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _label_str(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {series[-1]}")
+            lines.append(f"{self.name}_sum{labels} {series[-2]}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+def register_gauge(name: str, help: str, fn: Callable[[], Dict[str, float]], label: str):
+    # fn is called at scrape time and returns {label value: gauge value}
+    _gauges.append((name, help, fn, label))
+
+
+STAGE_SECONDS = Histogram("qonfido_stage_duration_seconds", "Time spent per request stage", labels=("stage",))
+LLM_TOKENS = Counter("qonfido_llm_tokens_total", "Tokens reported by OpenRouter usage", labels=("kind",))
+LLM_ATTEMPTS = Counter("qonfido_llm_attempts_total", "OpenRouter attempts by model and outcome "
+                       "(ok / retry / error / hedge / circuit_open)", labels=("model", "outcome"))
+LLM_COST = Counter("qonfido_llm_cost_credits_total", "OpenRouter credits reported by usage")
+LLM_PROMPT_TOKENS = Histogram("qonfido_llm_prompt_tokens", "Prompt tokens per LLM call", labels=("cache",),
+                              buckets=(256, 512, 1024, 1536, 2048, 3072, 4096, 6144, 8192, 16384))
+
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("timings", default=None)
+_usage: ContextVar[Optional[Dict[str, float]]] = ContextVar("usage", default=None)
+
+
+def start_request_timings() -> Dict[str, float]:
+    timings = {}
+    _timings.set(timings)
+    return timings
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = round(timings.get(stage, 0.0) + seconds * 1000, 3)
+
+
+@contextmanager
+def span(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def start_request_usage() -> Dict[str, float]:
+    usage = {}
+    _usage.set(usage)
+    return usage
+
+
+def parse_usage(usage: Optional[Dict]) -> Dict[str, float]:
+    # OpenRouter's usage block -> {prompt, completion, reasoning, cached,
+    # cache_write, cost}; cached and cache_write are part of prompt, reasoning
+    # is part of completion
+    if not usage:
+        return {}
+    prompt_details = usage.get("prompt_tokens_details") or {}
+    completion_details = usage.get("completion_tokens_details") or {}
+    counts = {
+        "prompt": usage.get("prompt_tokens") or 0,
+        "completion": usage.get("completion_tokens") or 0,
+        "reasoning": completion_details.get("reasoning_tokens") or 0,
+        "cached": prompt_details.get("cached_tokens") or 0,
+        "cache_write": prompt_details.get("cache_write_tokens") or 0,
+    }
+    if usage.get("cost") is not None:
+        counts["cost"] = usage["cost"]
+    return counts
+
+
+def record_usage(usage: Optional[Dict]) -> Dict[str, float]:
+    # aggregates one LLM call's usage into the metrics and the current
+    # request's totals (see start_request_usage)
+    counts = parse_usage(usage)
+    if not counts:
+        return counts
+    for kind, value in counts.items():
+        if kind == "cost":
+            LLM_COST.inc(value)
+        elif value:
+            LLM_TOKENS.inc(value, kind=kind)
+    LLM_PROMPT_TOKENS.observe(counts["prompt"], cache="hit" if counts["cached"] else "miss")
+    totals = _usage.get()
+    if totals is not None:
+        for kind, value in counts.items():
+            totals[kind] = totals.get(kind, 0) + value
+    return counts
+
+
+def render_prometheus() -> str:
+    lines = []
+    with _lock:
+        for metric in _registry:
+            lines.extend(metric.render())
+    for name, help, fn, label in _gauges:
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+        for key, value in fn().items():
+            lines.append(f'{name}{{{label}="{key}"}} {value}')
+    return "\n".join(lines) + "\n"
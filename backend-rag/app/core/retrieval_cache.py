@@ -0,0 +1,101 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from app.settings import (
+    LEXICAL_LOWERCASE, RETRIEVAL_CACHE_MAX_ENTRIES, RETRIEVAL_CACHE_DISK,
+    RETRIEVAL_CACHE_DIR, RETRIEVAL_CACHE_DISK_SIZE_LIMIT,
+)
+
+
+def normalize_query(query: str) -> str:
+    # no retriever cares about whitespace runs; case only matters when the
+    # analyzer keeps it (the intent parser lowercases, the default embedding
+    # model is uncased)
+    query = " ".join(query.split())
+    return query.lower() if LEXICAL_LOWERCASE else query
+
+
+# Retrieval results keyed on (mode, normalized query, k) for one retrieval
+# version (corpus fingerprint + retrieval config). An in-process LRU answers
+# hot queries; the optional diskcache tier is shared by the workers on a host
+# and survives restarts. Cached result lists are shared, so treat them as
+# read-only.
+class RetrievalCache:
+    def __init__(self, max_entries: int = RETRIEVAL_CACHE_MAX_ENTRIES, disk: bool = RETRIEVAL_CACHE_DISK,
+                 disk_dir: str = RETRIEVAL_CACHE_DIR, disk_size_limit: int = RETRIEVAL_CACHE_DISK_SIZE_LIMIT):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (mode, query, k) -> results
+        self._version = None
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        self._disk = None
+        if disk:
+            from diskcache import Cache
+            self._disk = Cache(disk_dir, size_limit=disk_size_limit, eviction_policy="least-recently-used")
+
+    def _check_version(self, version: str):
+        if version != self._version:
+            if self._entries:
+                self._stats["invalidations"] += 1
+            self._entries.clear()
+            self._version = version
+
+    def _disk_key(self, key, version: str) -> str:
+        # the version is part of the key, so a new corpus never reads old rows
+        digest = hashlib.sha256(f"{version}\0{key[0]}\0{key[1]}\0{key[2]}".encode("utf-8")).hexdigest()
+        return f"ret::v1::{digest}"
+
+    def _put_memory(self, key, results):
+        self._entries[key] = results
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get(self, mode: str, query: str, k: int, version: str) -> Optional[List[Dict]]:
+        key = (mode, normalize_query(query), k)
+        with self._lock:
+            self._check_version(version)
+            results = self._entries.get(key)
+            if results is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return results
+
+        if self._disk is not None:
+            results = self._disk.get(self._disk_key(key, version))
+            if results is not None:
+                with self._lock:
+                    self._check_version(version)
+                    self._put_memory(key, results)
+                    self._stats["disk_hits"] += 1
+                return results
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, mode: str, query: str, k: int, version: str, results: List[Dict]):
+        key = (mode, normalize_query(query), k)
+        with self._lock:
+            self._check_version(version)
+            self._put_memory(key, results)
+        if self._disk is not None:
+            self._disk.set(self._disk_key(key, version), results)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["disk_hits"] + self._stats["misses"]
+            hits = self._stats["hits"] + self._stats["disk_hits"]
+            return {**self._stats, "entries": len(self._entries),
+                    "hit_rate": hits / lookups if lookups else 0.0}
+
+
+retrieval_cache = RetrievalCache()
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import shutil
+import faiss
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Optional
+from .corpus import Corpus
+from .embed_utils import get_embeddings
+from .load_faqs import FAQS_CSV
+from .load_funds import FUNDS_CSV
+from ..retrieval.analyzer import Analyzer
+from ..retrieval.bm25 import BM25Index
+from ..retrieval.vector_index import build_index, configure_search, index_config, resolve_index_type
+from app.settings import BUNDLE_DIR, USE_BUNDLE, EMBED_MODEL
+
+# bump when the on-disk layout changes
+BUNDLE_VERSION = 2
+
+_FAQ_COLUMNS = ["source", "question", "answer", "text"]
+_FUND_COLUMNS = ["source", "fund_id", "fund_name", "category", "text"]
+
+
+# Every retrieval artifact for one corpus version, written once by
+# scripts/build_bundle.py and opened read-only (memory-mapped) by each worker:
+#
+#   manifest.json             version, fingerprints, model, index/analyzer config
+#   faqs.json, funds.json     document table columns
+#   numeric_<i>.npy           float32 fund metric columns
+#   bm25_*.npy, bm25_vocab.json
+#   index.faiss               over the L2-normalized document embeddings
+class Bundle:
+    def __init__(self, path: Path, manifest: dict, corpus: Corpus, bm25: BM25Index, index):
+        self.path = path
+        self.manifest = manifest
+        self.corpus = corpus
+        self.bm25 = bm25
+        self.index = index
+
+
+def source_fingerprint(analyzer: Optional[Analyzer] = None) -> str:
+    # hashes the raw CSV bytes (no pandas) plus everything that shapes the artifacts
+    analyzer = analyzer if analyzer is not None else Analyzer()
+    h = hashlib.sha256()
+    for path in (FAQS_CSV, FUNDS_CSV):
+        h.update(Path(path).read_bytes())
+    config = {"version": BUNDLE_VERSION, "model": EMBED_MODEL, "index": index_config(), "analyzer": analyzer.config()}
+    h.update(json.dumps(config, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _bundle_path(fingerprint: str, bundle_root: Path) -> Path:
+    return Path(bundle_root) / f"v{BUNDLE_VERSION}-{fingerprint[:16]}"
+
+
+def build_bundle(bundle_root: Path = BUNDLE_DIR) -> Path:
+    analyzer = Analyzer()
+    fingerprint = source_fingerprint(analyzer)
+    corpus = Corpus()
+
+    bm25 = BM25Index.build([analyzer(t) for t in corpus.texts])
+    embeddings = get_embeddings(corpus.texts)
+    faiss.normalize_L2(embeddings)
+    index = build_index(embeddings)
+
+    final = _bundle_path(fingerprint, bundle_root)
+    tmp = Path(bundle_root) / f".{final.name}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    with open(tmp / "faqs.json", "w") as f:
+        json.dump({c: corpus.faqs[c].tolist() for c in _FAQ_COLUMNS}, f)
+    with open(tmp / "funds.json", "w") as f:
+        json.dump({c: corpus.funds[c].tolist() for c in _FUND_COLUMNS}, f)
+    numeric_columns = list(corpus.numeric)
+    for i, col in enumerate(numeric_columns):
+        np.save(tmp / f"numeric_{i}.npy", corpus.numeric[col])
+    bm25.save(tmp)
+    faiss.write_index(index, str(tmp / "index.faiss"))
+
+    # the manifest goes last: a directory without one is never opened
+    manifest = {
+        "version": BUNDLE_VERSION,
+        "fingerprint": fingerprint,
+        "corpus_fingerprint": corpus.fingerprint,
+        "model": EMBED_MODEL,
+        "index_config": index_config(),
+        "numeric_columns": numeric_columns,
+        "n_docs": len(corpus),
+    }
+    with open(tmp / "manifest.json", "w") as f:
+        json.dump(manifest, f)
+
+    shutil.rmtree(final, ignore_errors=True)
+    os.replace(tmp, final)
+
+    for old in Path(bundle_root).glob("v*-*"):
+        if old != final:
+            shutil.rmtree(old, ignore_errors=True)
+    return final
+
+
+def _mmap_flag(manifest: dict) -> int:
+    # IO_FLAG_MMAP only maps IVF inverted lists; flat and HNSW keep their
+    # vectors in an IndexFlatCodes, which IO_FLAG_MMAP_IFC maps instead.
+    # Either way the vectors stay in the page cache, shared by the workers.
+    index_type = resolve_index_type(manifest["n_docs"], manifest["index_config"]["type"])
+    return faiss.IO_FLAG_MMAP if index_type.startswith("ivf") else faiss.IO_FLAG_MMAP_IFC
+
+
+def open_bundle(bundle_root: Path = BUNDLE_DIR) -> Optional[Bundle]:
+    fingerprint = source_fingerprint()
+    path = _bundle_path(fingerprint, bundle_root)
+    if not (path / "manifest.json").exists():
+        return None
+    with open(path / "manifest.json") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != BUNDLE_VERSION or manifest.get("fingerprint") != fingerprint:
+        return None
+
+    numeric = {
+        col: np.load(path / f"numeric_{i}.npy", mmap_mode="r")
+        for i, col in enumerate(manifest["numeric_columns"])
+    }
+    with open(path / "faqs.json") as f:
+        faqs = pd.DataFrame(json.load(f))
+    with open(path / "funds.json") as f:
+        funds = pd.DataFrame(json.load(f))
+    for col, values in numeric.items():
+        funds[col] = np.asarray(values)
+    corpus = Corpus(faqs=faqs, funds=funds, numeric=numeric)
+    corpus.__dict__["fingerprint"] = manifest["corpus_fingerprint"]
+
+    index = configure_search(faiss.read_index(str(path / "index.faiss"), _mmap_flag(manifest)))
+    return Bundle(path, manifest, corpus, bm25=BM25Index.load(path, mmap=True), index=index)
+
+
+_bundle = None
+_bundle_checked = False
+
+def get_bundle() -> Optional[Bundle]:
+    global _bundle, _bundle_checked
+    if not _bundle_checked:
+        _bundle_checked = True
+        if USE_BUNDLE:
+            try:
+                _bundle = open_bundle()
+            except Exception as e:
+                print(f"WARNING: could not open retrieval bundle, building in-process: {e}")
+    return _bundle
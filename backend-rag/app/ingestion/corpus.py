@@ -0,0 +1,80 @@
+import hashlib
+import numpy as np
+import pandas as pd
+from functools import cached_property
+from typing import Dict, List, Optional
+from .load_faqs import load_faqs
+from .load_funds import load_funds
+
+FUND_METRIC_COLUMNS = ["cagr_3yr (%)", "volatility (%)", "sharpe_ratio"]
+
+
+# Documents are laid out FAQs first, then funds; a document's position in
+# this table is the row id shared by BM25 and FAISS.
+class Corpus:
+    def __init__(self, faqs: Optional[pd.DataFrame] = None, funds: Optional[pd.DataFrame] = None,
+                 numeric: Optional[Dict[str, np.ndarray]] = None):
+        self.faqs = load_faqs() if faqs is None else faqs
+        self.funds = load_funds() if funds is None else funds
+        self.n_faqs = len(self.faqs)
+
+        # float32 fund metric columns, aligned with the rows of self.funds
+        if numeric is None:
+            numeric = {
+                col: pd.to_numeric(self.funds[col], errors="coerce").to_numpy(dtype=np.float32)
+                for col in FUND_METRIC_COLUMNS if col in self.funds.columns
+            }
+        self.numeric = numeric
+
+        self.texts: List[str] = list(self.faqs["text"]) + list(self.funds["text"])
+        self.ids: List[str] = list(self.faqs["source"]) + list(self.funds["source"])
+        self.types: List[str] = ["faq"] * len(self.faqs) + ["fund"] * len(self.funds)
+        self.meta: List[Dict] = (
+            [{"question": q} for q in self.faqs["question"]]
+            + [{"fund_name": n} for n in self.funds["fund_name"]]
+        )
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    @cached_property
+    def doc_hashes(self) -> List[str]:
+        return [hashlib.sha256(t.encode("utf-8")).hexdigest()[:32] for t in self.texts]
+
+    @cached_property
+    def fingerprint(self) -> str:
+        h = hashlib.sha256()
+        for sid, dh in zip(self.ids, self.doc_hashes):
+            h.update(f"{sid}\t{dh}\n".encode("utf-8"))
+        return h.hexdigest()
+
+    @cached_property
+    def positions(self) -> Dict[str, int]:
+        return {sid: i for i, sid in enumerate(self.ids)}
+
+    @cached_property
+    def fields(self) -> List[Dict]:
+        # the structured columns behind each document's text, for the context packer
+        faqs = [{"question": q, "answer": a} for q, a in zip(self.faqs["question"], self.faqs["answer"])]
+        funds = [
+            {"fund_name": name, "category": category, "cagr": cagr, "volatility": vol, "sharpe": sharpe}
+            for name, category, cagr, vol, sharpe in zip(
+                self.funds["fund_name"], self.funds["category"],
+                # numpy scalars keep their dtype, so bundle (float32) values still print as 12.4
+                *(self.funds[col].to_numpy() for col in FUND_METRIC_COLUMNS))
+        ]
+        return faqs + funds
+
+    def source(self, idx: int) -> Dict:
+        return {"id": self.ids[idx], "type": self.types[idx], "meta": dict(self.meta[idx])}
+
+
+_corpus = None
+
+def get_corpus() -> Corpus:
+    global _corpus
+    if _corpus is None:
+        from .bundle import get_bundle
+        bundle = get_bundle()
+        _corpus = bundle.corpus if bundle is not None else Corpus()
+    return _corpus
@@ -1,10 +1,13 @@
+import hashlib
+from typing import List
 from diskcache import Cache
 from sentence_transformers import SentenceTransformer
 import numpy as np
-from app.settings import DISKCACHE_DIR, EMBED_MODEL
+from app.settings import DISKCACHE_DIR, EMBED_MODEL, EMBED_CACHE_SIZE_LIMIT, EMBED_BATCH_SIZE
 
 _model = None
 _cache = None
+_stats = {"hits": 0, "misses": 0}
 
 def _get_model():
     global _model
@@ -15,17 +18,56 @@ def _get_model():
 def _get_cache():
     global _cache
     if _cache is None:
-        _cache = Cache(DISKCACHE_DIR)
+        _cache = Cache(DISKCACHE_DIR, size_limit=EMBED_CACHE_SIZE_LIMIT, eviction_policy="least-recently-used")
     return _cache
 
-def get_embedding(text: str) -> np.ndarray:
+def _cache_key(text: str) -> str:
+    # stable across processes, unlike hash(); the model name keeps vectors
+    # from different models apart
+    digest = hashlib.sha256(f"{EMBED_MODEL}\0{text}".encode("utf-8")).hexdigest()
+    return f"emb::v2::{digest}"
+
+def cache_stats() -> dict:
+    cache = _get_cache()
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "hit_rate": _stats["hits"] / lookups if lookups else 0.0,
+        "entries": len(cache),
+        "size_bytes": cache.volume(),
+    }
+
+def get_embeddings(texts: List[str], batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
     cache = _get_cache()
-    key = f"emb::{hash(text)}"
-    emb = cache.get(key)
-    if emb is not None:
-        return np.array(emb)
-
-    model = _get_model()
-    emb = model.encode([text], show_progress_bar=False)[0]
-    cache.set(key, emb.tolist())
-    return np.array(emb)
\ No newline at end of file
+    keys = [_cache_key(t) for t in texts]
+
+    found = {}
+    with cache.transact():
+        for key in set(keys):
+            emb = cache.get(key)
+            if emb is not None:
+                found[key] = np.frombuffer(emb, dtype=np.float32)
+
+    missing = {}
+    for text, key in zip(texts, keys):
+        if key not in found and key not in missing:
+            missing[key] = text
+
+    _stats["hits"] += len(keys) - len(missing)
+    _stats["misses"] += len(missing)
+
+    if missing:
+        model = _get_model()
+        encoded = model.encode(list(missing.values()), batch_size=batch_size, show_progress_bar=False)
+        encoded = np.asarray(encoded, dtype=np.float32)
+        with cache.transact():
+            for key, emb in zip(missing, encoded):
+                cache.set(key, emb.tobytes())
+                found[key] = emb
+
+    if not keys:
+        return np.zeros((0, _get_model().get_sentence_embedding_dimension()), dtype=np.float32)
+    return np.ascontiguousarray(np.vstack([found[k] for k in keys]), dtype=np.float32)
+
+def get_embedding(text: str) -> np.ndarray:
+    return get_embeddings([text])[0]
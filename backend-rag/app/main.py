@@ -1,10 +1,25 @@
-from fastapi import FastAPI
+import math
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from .api.routes import router
 from app.settings import OPENROUTER_API_KEY
+from app.core.llm import close_client
+from app.core.context_builder import load_tokenizer
+from app.core.llm_transport import LLMUnavailableError
+from app.core.executor import shutdown_executor
+from app.retrieval.hybrid import shutdown_fanout_pool
 
 app = FastAPI(title="Qonfido Mini RAG Backend")
 app.include_router(router)
 
+# every model failed or its circuit is open: tell the client when to come back
+# instead of a bare 500
+@app.exception_handler(LLMUnavailableError)
+async def llm_unavailable_handler(request: Request, exc: LLMUnavailableError):
+    headers = {"Retry-After": str(math.ceil(exc.retry_after))} if exc.retry_after is not None else None
+    return JSONResponse(status_code=exc.status, content={"detail": str(exc), "retry_after": exc.retry_after},
+                        headers=headers)
+
 @app.get("/health")
 async def health():
     return {"status": "ok"}
@@ -13,4 +28,12 @@ async def health():
 @app.on_event("startup")
 async def startup_event():
     if not OPENROUTER_API_KEY:
-        print("WARNING: OPENROUTER_API_KEY not set. LLM calls will fail.")
\ No newline at end of file
+        print("WARNING: OPENROUTER_API_KEY not set. LLM calls will fail.")
+    # before serving: build_context runs on the event loop
+    load_tokenizer()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await close_client()
+    shutdown_executor()
+    shutdown_fanout_pool()
@@ -0,0 +1,71 @@
+import re
+import sys
+from typing import Dict, Iterable, List, Optional
+from app.settings import LEXICAL_LOWERCASE, LEXICAL_STOPWORDS, LEXICAL_STEMMING, LEXICAL_SYNONYMS
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9]+(?:\.[0-9]+)?")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in into is it its me my
+of on or our should so than that the their them then there these they this to was we what when
+which who why will with you your
+""".split())
+
+
+def light_stem(token: str) -> str:
+    # plural / -ing / -ed stripping only; keeps short tokens and numbers intact
+    if len(token) <= 3 or not token.isalpha():
+        return token
+    if token.endswith("ies") and len(token) > 4:
+        return token[:-3] + "y"
+    if token.endswith("sses"):
+        return token[:-2]
+    if token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        token = token[:-1]
+    if token.endswith("ing") and len(token) > 5:
+        return token[:-3]
+    if token.endswith("ed") and len(token) > 4:
+        return token[:-2]
+    return token
+
+
+# One pipeline for both indexing and querying so the two always agree:
+# tokenize (drops punctuation) -> lowercase -> stopwords -> stem -> synonyms.
+# Synonyms are folded into their group's canonical term rather than expanded,
+# so "returns" and "CAGR" hit the same postings without growing the index.
+class Analyzer:
+    def __init__(self, lowercase: bool = LEXICAL_LOWERCASE, stopwords: Optional[Iterable[str]] = None,
+                 stemming: bool = LEXICAL_STEMMING, synonyms: Optional[Dict[str, List[str]]] = None):
+        self.lowercase = lowercase
+        if stopwords is None:
+            stopwords = STOPWORDS if LEXICAL_STOPWORDS else ()
+        self.stopwords = frozenset(stopwords)
+        self.stemming = stemming
+        if synonyms is None:
+            synonyms = LEXICAL_SYNONYMS
+        self.synonyms = {}
+        for canonical, variants in synonyms.items():
+            for term in [canonical, *variants]:
+                self.synonyms[self._normalize(term)] = self._normalize(canonical)
+
+    def _normalize(self, token: str) -> str:
+        if self.lowercase:
+            token = token.lower()
+        return light_stem(token) if self.stemming else token
+
+    def config(self) -> Dict:
+        return {"lowercase": self.lowercase, "stopwords": sorted(self.stopwords),
+                "stemming": self.stemming, "synonyms": self.synonyms}
+
+    def __call__(self, text: str) -> List[str]:
+        tokens = []
+        for token in _TOKEN_RE.findall(text):
+            if self.lowercase:
+                token = token.lower()
+            if token in self.stopwords:
+                continue
+            if self.stemming:
+                token = light_stem(token)
+            # interned so the many repeats of a term across documents share one string
+            tokens.append(sys.intern(self.synonyms.get(token, token)))
+        return tokens
@@ -0,0 +1,143 @@
+import json
+import numpy as np
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+
+# Okapi BM25 over a term-major inverted index. Each posting stores its final
+# per-(term, doc) weight idf * tf * (k1 + 1) / (tf + k1 * norm(doc)), so a
+# query only sums the weights of the postings of its own terms. Scores match
+# rank_bm25.BM25Okapi (same k1, b and epsilon floor for negative idf).
+class BM25Index:
+    def __init__(self, vocab: Dict[str, int], indptr: np.ndarray, doc_ids: np.ndarray,
+                 weights: np.ndarray, doc_len: np.ndarray):
+        self.vocab = vocab
+        self.indptr = indptr # postings of term t are doc_ids/weights[indptr[t]:indptr[t + 1]]
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.doc_len = doc_len
+        self.n_docs = len(doc_len)
+
+    @classmethod
+    def build(cls, tokenized: Sequence[List[str]], k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        vocab: Dict[str, int] = {}
+        term_ids, doc_ids, tfs = [], [], []
+        doc_len = np.zeros(len(tokenized), dtype=np.float32)
+
+        for d, tokens in enumerate(tokenized):
+            doc_len[d] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_ids.append(d)
+                tfs.append(tf)
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        tfs = np.asarray(tfs, dtype=np.float32)
+
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, doc_ids, tfs = term_ids[order], doc_ids[order], tfs[order]
+        df = np.bincount(term_ids, minlength=len(vocab))
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=indptr[1:])
+
+        n = len(tokenized)
+        idf = np.log(n - df + 0.5) - np.log(df + 0.5)
+        average_idf = idf.sum() / len(idf) if len(idf) else 0.0
+        idf[idf < 0] = epsilon * average_idf
+
+        avgdl = doc_len.mean() if n else 0.0
+        norm = k1 * (1 - b + b * doc_len / avgdl) if avgdl else np.full(n, k1, dtype=np.float32)
+        weights = idf[term_ids] * tfs * (k1 + 1) / (tfs + norm[doc_ids])
+        return cls(vocab, indptr, doc_ids, weights.astype(np.float32), doc_len)
+
+    def save(self, directory: Path):
+        np.save(directory / "bm25_indptr.npy", self.indptr)
+        np.save(directory / "bm25_doc_ids.npy", self.doc_ids)
+        np.save(directory / "bm25_weights.npy", self.weights)
+        np.save(directory / "bm25_doc_len.npy", self.doc_len)
+        terms = sorted(self.vocab, key=self.vocab.get)
+        with open(directory / "bm25_vocab.json", "w") as f:
+            json.dump(terms, f)
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True):
+        # memory-mapped postings are shared between workers via the page cache
+        mode = "r" if mmap else None
+        with open(directory / "bm25_vocab.json") as f:
+            vocab = {term: i for i, term in enumerate(json.load(f))}
+        return cls(
+            vocab,
+            np.load(directory / "bm25_indptr.npy", mmap_mode=mode),
+            np.load(directory / "bm25_doc_ids.npy", mmap_mode=mode),
+            np.load(directory / "bm25_weights.npy", mmap_mode=mode),
+            np.load(directory / "bm25_doc_len.npy", mmap_mode=mode),
+        )
+
+    def search(self, tokens: Sequence[str], top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        # repeated query terms count once per occurrence, as in BM25Okapi.get_scores
+        spans = [(self.indptr[t], self.indptr[t + 1]) for t in (self.vocab.get(tok) for tok in tokens) if t is not None]
+        if not spans or top_k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        docs = np.concatenate([self.doc_ids[s:e] for s, e in spans])
+        weights = np.concatenate([self.weights[s:e] for s, e in spans])
+
+        if len(docs) * 8 > self.n_docs:
+            # dense accumulation is cheaper once postings cover a good share of the corpus
+            scores = np.bincount(docs, weights=weights, minlength=self.n_docs)
+            cand = np.flatnonzero(scores)
+            scores = scores[cand]
+        else:
+            cand, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=weights)
+
+        k = min(top_k, len(cand))
+        if k < len(cand):
+            # keep every doc tied with the k-th score so ties break by doc id, not partition order
+            kth = -np.partition(-scores, k - 1)[k - 1]
+            top = np.flatnonzero(scores >= kth)
+        else:
+            top = np.arange(len(cand))
+        top = top[np.lexsort((cand[top], -scores[top]))][:k]
+        return cand[top], scores[top]
+
+    def search_batch(self, token_lists: Sequence[Sequence[str]], top_k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        # scores every query in one accumulation keyed by (query, doc); each
+        # query's hits come out exactly as search() would return them
+        n_queries = len(token_lists)
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+        qids, spans = [], []
+        for q, tokens in enumerate(token_lists):
+            for t in (self.vocab.get(tok) for tok in tokens):
+                if t is not None:
+                    qids.append(q)
+                    spans.append((self.indptr[t], self.indptr[t + 1]))
+        if not spans or top_k <= 0:
+            return [empty] * n_queries
+
+        lengths = np.array([e - s for s, e in spans], dtype=np.int64)
+        docs = np.concatenate([self.doc_ids[s:e] for s, e in spans])
+        weights = np.concatenate([self.weights[s:e] for s, e in spans])
+        keys = np.repeat(np.asarray(qids, dtype=np.int64), lengths) * self.n_docs + docs
+
+        if len(keys) * 8 > n_queries * self.n_docs:
+            scores = np.bincount(keys, weights=weights, minlength=n_queries * self.n_docs)
+            cand = np.flatnonzero(scores)
+            scores = scores[cand]
+        else:
+            cand, inverse = np.unique(keys, return_inverse=True)
+            scores = np.bincount(inverse, weights=weights)
+
+        # query ascending, then score descending, then doc id ascending
+        cand_q, cand_doc = np.divmod(cand, self.n_docs)
+        order = np.lexsort((cand_doc, -scores, cand_q))
+        cand_q, cand_doc, scores = cand_q[order], cand_doc[order], scores[order]
+        bounds = np.searchsorted(cand_q, np.arange(n_queries + 1))
+
+        results = []
+        for q in range(n_queries):
+            start, end = bounds[q], min(bounds[q + 1], bounds[q] + top_k)
+            results.append((cand_doc[start:end], scores[start:end]) if end > start else empty)
+        return results
@@ -0,0 +1,84 @@
+import numpy as np
+from typing import Tuple
+
+# Score fusion for hybrid retrieval over the two branches' hit lists, given as
+# doc-row id arrays with their scores (best first). Docs missing from one
+# branch get that branch's floor: 0, or its lowest z-score for zscore.
+#
+#   alpha  - each branch divided by its max, then (1 - alpha) * lex + alpha * sem
+#   minmax - each branch rescaled to [0, 1] by its min and max, then alpha blend
+#   zscore - each branch standardized, then alpha blend
+#   rrf    - reciprocal rank fusion: sum of 1 / (rrf_k + rank), ignores scores
+#   max    - the larger raw score of the two branches
+FUSION_METHODS = ("alpha", "minmax", "zscore", "rrf", "max")
+
+
+def _alpha_norm(scores: np.ndarray) -> np.ndarray:
+    top = scores.max() if len(scores) else 1.0
+    return scores / top if top else np.zeros_like(scores)
+
+
+def _minmax_norm(scores: np.ndarray) -> np.ndarray:
+    if not len(scores):
+        return scores
+    lo, hi = scores.min(), scores.max()
+    return (scores - lo) / (hi - lo) if hi > lo else np.ones_like(scores)
+
+
+def _zscore_norm(scores: np.ndarray) -> np.ndarray:
+    if not len(scores):
+        return scores
+    std = scores.std()
+    return (scores - scores.mean()) / std if std else np.zeros_like(scores)
+
+
+def _rrf_norm(scores: np.ndarray, rrf_k: int) -> np.ndarray:
+    return 1.0 / (rrf_k + np.arange(1, len(scores) + 1, dtype=np.float64))
+
+
+def fuse(lex_ids: np.ndarray, lex_scores: np.ndarray, sem_ids: np.ndarray, sem_scores: np.ndarray,
+         method: str = "alpha", alpha: float = 0.5, rrf_k: int = 60, top_k: int = None
+         ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # returns (ids, fused scores, raw lex scores, raw sem scores) sorted by fused
+    # score; ties keep first-seen order (lexical hits, then semantic-only hits)
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method {method!r}; expected one of {FUSION_METHODS}")
+    lex_scores = np.asarray(lex_scores, dtype=np.float64)
+    sem_scores = np.asarray(sem_scores, dtype=np.float64)
+    n_lex = len(lex_ids)
+
+    ids, first_seen, inverse = np.unique(np.concatenate([lex_ids, sem_ids]), return_index=True, return_inverse=True)
+    lex_pos, sem_pos = inverse[:n_lex], inverse[n_lex:]
+
+    lex_raw = np.zeros(len(ids))
+    sem_raw = np.zeros(len(ids))
+    lex_raw[lex_pos] = lex_scores
+    sem_raw[sem_pos] = sem_scores
+
+    if method == "max":
+        fused = np.maximum(lex_raw, sem_raw)
+    else:
+        if method == "alpha":
+            lex_norm, sem_norm = _alpha_norm(lex_scores), _alpha_norm(sem_scores)
+        elif method == "minmax":
+            lex_norm, sem_norm = _minmax_norm(lex_scores), _minmax_norm(sem_scores)
+        elif method == "zscore":
+            lex_norm, sem_norm = _zscore_norm(lex_scores), _zscore_norm(sem_scores)
+        else:
+            lex_norm, sem_norm = _rrf_norm(lex_scores, rrf_k), _rrf_norm(sem_scores, rrf_k)
+
+        lex_fill = lex_norm.min() if method == "zscore" and len(lex_norm) else 0.0
+        sem_fill = sem_norm.min() if method == "zscore" and len(sem_norm) else 0.0
+        lex_part = np.full(len(ids), lex_fill)
+        sem_part = np.full(len(ids), sem_fill)
+        lex_part[lex_pos] = lex_norm
+        sem_part[sem_pos] = sem_norm
+        if method == "rrf":
+            fused = lex_part + sem_part
+        else:
+            fused = (1 - alpha) * lex_part + alpha * sem_part
+
+    order = np.lexsort((first_seen, -fused))
+    if top_k is not None:
+        order = order[:top_k]
+    return ids[order], fused[order], lex_raw[order], sem_raw[order]
@@ -1,115 +1,164 @@
+import contextvars
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 from .lexical import LexicalRetriever
 from .semantic import SemanticRetriever
 from .numeric import NumericRetriever
-from app.settings import HYBRID_ALPHA, TOP_K_LEXICAL, TOP_K_SEMANTIC, FAQ_TOP_K
+from .intent import parse_intent
+from .fusion import fuse
+from ..core.metrics import span
+from app.settings import (
+    HYBRID_ALPHA, HYBRID_FUSION, HYBRID_LEXICAL_DEPTH, HYBRID_SEMANTIC_DEPTH, HYBRID_RRF_K,
+    FAQ_TOP_K, HYBRID_FANOUT_WORKERS,
+)
 
-class HybridRetriever:
-    def __init__(self):
-        self.lex = LexicalRetriever()
-        self.sem = SemanticRetriever()
-        self.num = NumericRetriever()
+NUMERIC_FAQ_TOP_K = 3 # FAQ rows appended to numeric results as context
 
-    def _is_definition_query(self, q: str) -> bool:
-        q = q.lower()
-        keywords = ["meaning", "mean", "explain", "define", "state", "mention"]
-        return any(k in q for k in keywords)    
+# separate from the request-level retrieval pool so a hybrid query running
+# there can never wait on its own pool
+_fanout_pool = None
 
-    def retrieve(self, query: str, top_k: int = 10, alpha: float = HYBRID_ALPHA):
+def _get_fanout_pool() -> ThreadPoolExecutor:
+    global _fanout_pool
+    if _fanout_pool is None:
+        _fanout_pool = ThreadPoolExecutor(max_workers=HYBRID_FANOUT_WORKERS, thread_name_prefix="hybrid")
+    return _fanout_pool
+
+
+def shutdown_fanout_pool():
+    global _fanout_pool
+    if _fanout_pool is not None:
+        _fanout_pool.shutdown(wait=False)
+        _fanout_pool = None
 
-        if self.num.is_numeric_query(query):
-            num_results = self.num.retrieve(query, top_k=top_k)
-            
-            if num_results:
-                faq_context = self.sem.retrieve(query, top_k=3)
-                faq_only = [r for r in faq_context if r["source"]["type"] == "faq"]
-                return num_results + faq_only
-            
-        if self._is_definition_query(query):
-            lex_res = [r for r in self.lex.retrieve(query, top_k=FAQ_TOP_K)
-                    if r["source"]["type"] == "faq"]
-            sem_res = [r for r in self.sem.retrieve(query, top_k=FAQ_TOP_K)
-                    if r["source"]["type"] == "faq"]
-
-            candidates = {}
-
-            for r in lex_res:
-                sid = r["source"]["id"]
-                candidates[sid] = {
-                    "source": r["source"],
-                    "text": r["text"],
-                    "lex_score": r["score"],
-                    "sem_score": 0.0
-                }
-
-            for r in sem_res:
-                sid = r["source"]["id"]
-                if sid not in candidates:
-                    candidates[sid] = {
-                        "source": r["source"],
-                        "text": r["text"],
-                        "lex_score": 0.0,
-                        "sem_score": r["score"]
-                    }
-                else:
-                    candidates[sid]["sem_score"] = r["score"]
-
-            fused = []
-            for sid, v in candidates.items():
-                fused.append({
-                    "score": max(v["lex_score"], v["sem_score"]), 
-                    "source": v["source"],
-                    "text": v["text"],
-                    "lex_score": v["lex_score"],
-                    "sem_score": v["sem_score"],
-                })
-
-            return sorted(fused, key=lambda x: x["score"], reverse=True) 
-
-        lex_res = self.lex.retrieve(query, top_k=TOP_K_LEXICAL)
-        sem_res = self.sem.retrieve(query, top_k=TOP_K_SEMANTIC)
-
-        lex_scores = [r["score"] for r in lex_res]
-        sem_scores = [r["score"] for r in sem_res]
-        max_lex = max(lex_scores) if lex_scores else 1.0
-        max_sem = max(sem_scores) if sem_scores else 1.0
-
-        candidates = {}
-        for r in lex_res:
-            sid = r["source"]["id"]
-            candidates[sid] = {
-                "source": r["source"],
-                "text": r["text"],
-                "lex_score": r["score"],
-                "sem_score": 0.0
-            }
-
-        for r in sem_res:
-            sid = r["source"]["id"]
-            if sid not in candidates:
-                candidates[sid] = {
-                    "source": r["source"],
-                    "text": r["text"],
-                    "lex_score": 0.0,
-                    "sem_score": r["score"]
-                }
-            else:
-                candidates[sid]["sem_score"] = r["score"]
 
-        fused = []
-        for sid, v in candidates.items():
-            norm_lex = v["lex_score"] / max_lex if max_lex else 0.0
-            norm_sem = v["sem_score"] / max_sem if max_sem else 0.0
+def _traced(stage: str, fn, *args, **kwargs):
+    with span(stage):
+        return fn(*args, **kwargs)
 
-            score = (1 - alpha) * norm_lex + alpha * norm_sem
 
-            fused.append({
-                "score": float(score),
-                "source": v["source"],
-                "text": v["text"],
-                "lex_score": v["lex_score"],
-                "sem_score": v["sem_score"]
-            })
+def _fan_out(*calls):
+    # calls are (stage, fn, args, kwargs); BM25 (numpy) and FAISS release the
+    # GIL, so the branches genuinely overlap
+    pool = _get_fanout_pool()
+    futures = [
+        pool.submit(contextvars.copy_context().run, _traced, stage, fn, *args, **kwargs)
+        for stage, fn, args, kwargs in calls
+    ]
+    return [f.result() for f in futures]
 
-        fused_sorted = sorted(fused, key=lambda x: x["score"], reverse=True)
 
-        return fused_sorted[:top_k]
+class HybridRetriever:
+    def __init__(self, lex: Optional[LexicalRetriever] = None, sem: Optional[SemanticRetriever] = None,
+                 num: Optional[NumericRetriever] = None, fusion: str = HYBRID_FUSION,
+                 lex_depth: int = HYBRID_LEXICAL_DEPTH, sem_depth: int = HYBRID_SEMANTIC_DEPTH,
+                 rrf_k: int = HYBRID_RRF_K):
+        self.lex = lex if lex is not None else LexicalRetriever()
+        self.sem = sem if sem is not None else SemanticRetriever()
+        self.num = num if num is not None else NumericRetriever()
+        self.corpus = self.sem.corpus
+        self.fusion = fusion
+        self.lex_depth = lex_depth
+        self.sem_depth = sem_depth
+        self.rrf_k = rrf_k
+
+    def _hits(self, ids, scores):
+        return [{"score": float(s), "source": self.corpus.source(i), "text": self.corpus.texts[i]}
+                for i, s in zip(ids, scores)]
+
+    def _fused(self, fused):
+        # result dicts are only built for the rows that survive fusion
+        return [
+            {"score": float(score), "source": self.corpus.source(i), "text": self.corpus.texts[i],
+             "lex_score": float(lex_score), "sem_score": float(sem_score)}
+            for i, score, lex_score, sem_score in zip(*fused)
+        ]
+
+    def _faq_context(self, sem_hit, k: int = NUMERIC_FAQ_TOP_K):
+        ids, scores = sem_hit[0][:k], sem_hit[1][:k]
+        faq = ids < self.corpus.n_faqs  # FAQs are the first rows of the corpus
+        return self._hits(ids[faq], scores[faq])
+
+    def _fuse_definition(self, lex_hit, sem_hit):
+        # FAQ hits only, each scored by its better branch
+        lex_ids, lex_scores = lex_hit[0][:FAQ_TOP_K], lex_hit[1][:FAQ_TOP_K]
+        sem_ids, sem_scores = sem_hit[0][:FAQ_TOP_K], sem_hit[1][:FAQ_TOP_K]
+        lex_faq, sem_faq = lex_ids < self.corpus.n_faqs, sem_ids < self.corpus.n_faqs
+        return self._fused(fuse(lex_ids[lex_faq], lex_scores[lex_faq], sem_ids[sem_faq], sem_scores[sem_faq],
+                                method="max"))
+
+    def _fuse_general(self, lex_hit, sem_hit, top_k: int, alpha: float, fusion: str):
+        lex_ids, lex_scores = lex_hit[0][:self.lex_depth], lex_hit[1][:self.lex_depth]
+        sem_ids, sem_scores = sem_hit[0][:self.sem_depth], sem_hit[1][:self.sem_depth]
+        with span("hybrid.fusion"):
+            fused = fuse(lex_ids, lex_scores, sem_ids, sem_scores, method=fusion, alpha=alpha,
+                         rrf_k=self.rrf_k, top_k=top_k)
+        return self._fused(fused)
+
+    def retrieve(self, query: str, top_k: int = 10, alpha: float = HYBRID_ALPHA, q_emb: Optional[np.ndarray] = None,
+                 fusion: Optional[str] = None):
+        # embedded once and shared by every semantic search below
+        if q_emb is None:
+            q_emb = self.sem.embed_query(query)
+
+        # parsed once (and memoized) for routing and the numeric branch
+        intent = parse_intent(query)
+
+        if intent.is_numeric:
+            num_results, sem_hit = _fan_out(
+                ("hybrid.numeric", self.num.retrieve, (query,), {"top_k": top_k, "intent": intent}),
+                ("hybrid.semantic", self.sem.search, (query,), {"top_k": NUMERIC_FAQ_TOP_K, "q_emb": q_emb}),
+            )
+
+            if num_results:
+                return num_results + self._faq_context(sem_hit)
+
+        if intent.is_definition:
+            lex_hit, sem_hit = _fan_out(
+                ("hybrid.lexical", self.lex.search, (query,), {"top_k": FAQ_TOP_K}),
+                ("hybrid.semantic", self.sem.search, (query,), {"top_k": FAQ_TOP_K, "q_emb": q_emb}),
+            )
+            return self._fuse_definition(lex_hit, sem_hit)
+
+        lex_hit, sem_hit = _fan_out(
+            ("hybrid.lexical", self.lex.search, (query,), {"top_k": self.lex_depth}),
+            ("hybrid.semantic", self.sem.search, (query,), {"top_k": self.sem_depth, "q_emb": q_emb}),
+        )
+        return self._fuse_general(lex_hit, sem_hit, top_k, alpha, fusion or self.fusion)
+
+    def retrieve_batch(self, queries: List[str], top_k: int = 10, alpha: float = HYBRID_ALPHA,
+                       q_embs: Optional[np.ndarray] = None, fusion: Optional[str] = None):
+        # Same routing as retrieve(), but every query goes through one batched
+        # BM25 pass and one multi-vector FAISS search at the deepest k any route
+        # needs; each route then truncates to its own depth.
+        if not queries:
+            return []
+        if q_embs is None:
+            q_embs = self.sem.embed_queries(queries)
+        intents = [parse_intent(q) for q in queries]
+
+        with span("hybrid.numeric"):
+            num_results = [
+                self.num.retrieve(q, top_k=top_k, intent=intent) if intent.is_numeric else []
+                for q, intent in zip(queries, intents)
+            ]
+        lexical = [i for i, res in enumerate(num_results) if not res]
+
+        sem_k = max(NUMERIC_FAQ_TOP_K, FAQ_TOP_K, self.sem_depth)
+        lex_k = max(FAQ_TOP_K, self.lex_depth)
+        lex_hits, sem_hits = _fan_out(
+            ("hybrid.lexical", self.lex.search_batch, ([queries[i] for i in lexical],), {"top_k": lex_k}),
+            ("hybrid.semantic", self.sem.search_batch, (queries,), {"top_k": sem_k, "q_embs": q_embs}),
+        )
+        lex_hits = dict(zip(lexical, lex_hits))
+
+        results = []
+        for i, intent in enumerate(intents):
+            if num_results[i]:
+                results.append(num_results[i] + self._faq_context(sem_hits[i]))
+            elif intent.is_definition:
+                results.append(self._fuse_definition(lex_hits[i], sem_hits[i]))
+            else:
+                results.append(self._fuse_general(lex_hits[i], sem_hits[i], top_k, alpha, fusion or self.fusion))
+        return results
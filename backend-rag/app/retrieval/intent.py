@@ -0,0 +1,189 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
+from app.settings import INTENT_CACHE_SIZE
+
+METRIC_MAPPINGS = {
+    "sharpe": "sharpe_ratio",
+    "sharpe ratio": "sharpe_ratio",
+    "risk-adjusted": "sharpe_ratio",
+    "risk adjusted": "sharpe_ratio",
+
+    "cagr": "cagr_3y",
+    "return": "cagr_3y",
+    "returns": "cagr_3y",
+    "growth": "cagr_3y",
+
+    "volatility": "volatility",
+    "risk": "volatility",
+    "variance": "volatility",
+    "std": "volatility",
+    "standard deviation": "volatility",
+}
+
+ASCENDING_KEYWORDS = [
+    "lowest", "minimum", "min", "worst", "bottom", "least",
+    "avoid", "not consider", "stay away", "don't invest"
+]
+
+DESCENDING_KEYWORDS = [
+    "highest", "maximum", "max", "best", "top", "most",
+    "recommend", "consider", "invest", "outperform"
+]
+
+RANKING_KEYWORDS = ["compare", "rank", "sort", "order"]
+
+DEFINITION_KEYWORDS = ["meaning", "mean", "explain", "define", "state", "mention"]
+
+# phrasing that asks for advice or explanation rather than a list, so the
+# numeric rows alone do not answer it
+OPEN_ENDED_KEYWORDS = [
+    "why", "how", "should", "would", "could", "explain", "compare", "recommend",
+    "suggest", "advise", "advice", "worth", "versus", "vs", "difference",
+    "better", "pros", "cons", "tell me",
+]
+
+NUMBER_WORDS = {
+    'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
+    'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10
+}
+
+_KEYWORD_KINDS = {}
+for _kind, _words in (("asc", ASCENDING_KEYWORDS), ("desc", DESCENDING_KEYWORDS),
+                      ("rank", RANKING_KEYWORDS), ("def", DEFINITION_KEYWORDS)):
+    for _w in _words:
+        _KEYWORD_KINDS[_w] = _kind
+
+
+def _alternation(words) -> str:
+    # longest first so "risk adjusted" wins over "risk" at the same position
+    return "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+
+# One scan finds every metric mention and keyword. The lookahead makes matches
+# zero-width, so keywords nested in other words ("consider" inside "not
+# consider", "mean" inside "meaning") are still seen, like the substring
+# checks this replaces. Metrics must start on a word boundary.
+_SCAN_RE = re.compile(
+    r"(?=\b(?P<metric>" + _alternation(METRIC_MAPPINGS) + r")|(?P<kw>" + _alternation(_KEYWORD_KINDS) + r"))"
+)
+
+_THRESHOLD_RE = re.compile(
+    r"(?:(?P<gt>above|over|greater than|more than|>)"
+    r"|(?P<lt>below|under|less than|<)"
+    r"|(?P<gte>at least|minimum)"
+    r"|(?P<lte>at most|maximum))"
+    r"\s*(?P<value>\d+\.?\d*)\s*%?"
+)
+
+_OPEN_ENDED_RE = re.compile(r"\b(?:" + _alternation(OPEN_ENDED_KEYWORDS) + r")\b")
+
+# direction keywords that are also threshold operators ("at least",
+# "minimum 1.2"); on their own next to a number they may be either
+_THRESHOLD_KEYWORDS = {"min", "minimum", "max", "maximum", "least", "most"}
+_NUMBER_RE = re.compile(r"\d+\.?\d*")
+
+_TOP_K_PATTERNS = [
+    re.compile(r'top\s+(\d+)'),
+    re.compile(r'(\d+)\s+(?:best|worst|top|bottom)'),
+    re.compile(r'top\s+(\w+)'),
+]
+
+
+@dataclass(frozen=True)
+class QueryIntent:
+    metric: Optional[str]  # first metric mentioned
+    ascending: bool
+    predicates: Tuple[Tuple[str, str, float], ...]  # (metric, operator, value)
+    k: Optional[int]  # explicit "top N", None when the query does not ask for a count
+    is_numeric: bool
+    is_definition: bool
+    metrics: Tuple[str, ...] = ()  # every metric mentioned, in order
+    order_conflict: bool = False  # sort direction unclear ("top 3 lowest", "minimum sharpe of 1")
+    open_ended: bool = False
+
+    @property
+    def is_plain_ranking(self) -> bool:
+        # one metric, one sort direction, nothing to interpret: the numeric
+        # rows are the whole answer
+        return (self.is_numeric and not self.is_definition and not self.open_ended
+                and not self.order_conflict and len(set(self.metrics)) == 1)
+
+    @property
+    def threshold(self) -> Optional[Tuple[str, float]]:
+        for metric, operator, value in self.predicates:
+            if metric == self.metric:
+                return (operator, value)
+        return (self.predicates[0][1], self.predicates[0][2]) if self.predicates else None
+
+
+def _extract_top_k(q: str) -> Optional[int]:
+    for pattern in _TOP_K_PATTERNS:
+        match = pattern.search(q)
+        if match:
+            num_str = match.group(1)
+            if num_str in NUMBER_WORDS:
+                return NUMBER_WORDS[num_str]
+            try:
+                return int(num_str)
+            except ValueError:
+                continue
+    return None
+
+
+def _operator(m: re.Match) -> str:
+    for op in ("gt", "lt", "gte", "lte"):
+        if m.group(op) is not None:
+            return op
+    return "gt"
+
+
+@lru_cache(maxsize=INTENT_CACHE_SIZE)
+def parse_intent(query: str) -> QueryIntent:
+    q = query.lower()
+    thresholds = list(_THRESHOLD_RE.finditer(q))
+
+    def in_threshold(pos: int) -> bool:
+        return any(t.start() <= pos < t.end() for t in thresholds)
+
+    mentions = []  # (start, end, metric)
+    kinds = set()
+    threshold_words = False
+    for m in _SCAN_RE.finditer(q):
+        word = m.group("metric")
+        if word is not None:
+            if not mentions or m.start() >= mentions[-1][1]:
+                mentions.append((m.start(), m.start() + len(word), METRIC_MAPPINGS[word]))
+        elif not in_threshold(m.start()):
+            # "at least 1" is a filter, not a sort direction
+            kinds.add(_KEYWORD_KINDS[m.group("kw")])
+            threshold_words |= m.group("kw") in _THRESHOLD_KEYWORDS
+
+    # "sharpe above 1 and volatility below 10%" -> each threshold binds to the
+    # closest metric mentioned before it (or, failing that, the first one after)
+    predicates = []
+    if mentions:
+        for m in thresholds:
+            before = [x for x in mentions if x[1] <= m.start()]
+            metric = before[-1][2] if before else mentions[0][2]
+            predicates.append((metric, _operator(m), float(m.group("value"))))
+
+    # "a minimum sharpe of 1": a threshold word used as a direction while a
+    # number other than the top-k is left over could mean either
+    k = _extract_top_k(q)
+    loose_numbers = {float(n.group()) for n in _NUMBER_RE.finditer(q) if not in_threshold(n.start())} - {k}
+
+    metric = mentions[0][2] if mentions else None
+    return QueryIntent(
+        metric=metric,
+        ascending="asc" in kinds and "desc" not in kinds,
+        predicates=tuple(predicates),
+        k=k,
+        is_numeric=metric is not None and (bool(kinds & {"asc", "desc", "rank"}) or bool(predicates)),
+        is_definition="def" in kinds,
+        metrics=tuple(x[2] for x in mentions),
+        order_conflict={"asc", "desc"} <= kinds or (threshold_words and bool(loose_numbers)),
+        open_ended=_OPEN_ENDED_RE.search(q) is not None,
+    )
+
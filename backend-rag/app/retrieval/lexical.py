@@ -1,35 +1,46 @@
-from rank_bm25 import BM25Okapi
-from ..ingestion.load_faqs import load_faqs
-from ..ingestion.load_funds import load_funds
+from typing import List, Optional
+from .analyzer import Analyzer
+from .bm25 import BM25Index
+from ..ingestion.corpus import Corpus, get_corpus
+from ..ingestion.bundle import get_bundle
+from ..core.metrics import span
 
 
 class LexicalRetriever:
-    def __init__(self):
-        faqs = load_faqs()
-        funds = load_funds()
-        self.faqs = faqs
-        self.funds = funds
-        self.corpus = list(faqs["text"]) + list(funds["text"])
-        tokenized = [doc.split() for doc in self.corpus]
-        self.bm25 = BM25Okapi(tokenized)
+    def __init__(self, corpus: Optional[Corpus] = None, analyzer: Optional[Analyzer] = None,
+                 bm25: Optional[BM25Index] = None):
+        self.corpus = corpus if corpus is not None else get_corpus()
+        bundle = get_bundle()
+        if bm25 is None and analyzer is None and bundle is not None and bundle.corpus is self.corpus:
+            bm25 = bundle.bm25
+        self.analyzer = analyzer if analyzer is not None else Analyzer()
+        if bm25 is None:
+            bm25 = BM25Index.build([self.analyzer(doc) for doc in self.corpus.texts])
+        self.bm25 = bm25
+
+
+    def _to_results(self, top_n, scores):
+        return [
+            {"score": float(score), "source": self.corpus.source(idx), "text": self.corpus.texts[idx]}
+            for idx, score in zip(top_n, scores)
+        ]
+
+
+    def search(self, query: str, top_k: int = 5):
+        # (doc rows, scores), best first
+        with span("lexical.bm25"):
+            return self.bm25.search(self.analyzer(query), top_k)
+
+
+    def search_batch(self, queries: List[str], top_k: int = 5):
+        token_lists = [self.analyzer(q) for q in queries]
+        with span("lexical.bm25_batch"):
+            return self.bm25.search_batch(token_lists, top_k)
 
 
     def retrieve(self, query: str, top_k: int = 5):
-        tokens = query.split()
-        scores = self.bm25.get_scores(tokens)
-        top_n = scores.argsort()[::-1][:top_k]
-
-        results = []
-        for idx in top_n:
-            snippet = self.corpus[idx]
-            if idx < len(self.faqs):
-                row = self.faqs.iloc[idx]
-                source = {"id": row.source, "type": "faq", "meta": {"question": row.question}}
-            else:
-                fidx = idx - len(self.faqs)
-                row = self.funds.iloc[fidx]
-                source = {"id": row.source, "type": "fund", "meta": {"fund_name": row.fund_name}}
-
-            results.append({"score": float(scores[idx]), "source": source, "text": snippet})
-
-        return results
+        return self._to_results(*self.search(query, top_k))
+
+
+    def retrieve_batch(self, queries: List[str], top_k: int = 5):
+        return [self._to_results(top_n, scores) for top_n, scores in self.search_batch(queries, top_k)]
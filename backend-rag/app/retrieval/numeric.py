@@ -1,217 +1,144 @@
 import re
-import pandas as pd
+import numpy as np
 from typing import List, Dict, Optional, Tuple
-from ..ingestion.load_funds import load_funds
+from ..ingestion.corpus import Corpus, get_corpus
+from .intent import QueryIntent, parse_intent
 
 
 class NumericRetriever:
-    METRIC_MAPPINGS = {
-        "sharpe": "sharpe_ratio",
-        "sharpe ratio": "sharpe_ratio",
-        "risk-adjusted": "sharpe_ratio",
-        "risk adjusted": "sharpe_ratio",
-        
-        "cagr": "cagr_3y",
-        "return": "cagr_3y",
-        "returns": "cagr_3y",
-        "growth": "cagr_3y",
-        
-        "volatility": "volatility",
-        "risk": "volatility",
-        "variance": "volatility",
-        "std": "volatility",
-        "standard deviation": "volatility",
+    # metric name -> Corpus.numeric column (values are already in % units)
+    METRIC_COLUMNS = {
+        "sharpe_ratio": "sharpe_ratio",
+        "cagr_3y": "cagr_3yr (%)",
+        "volatility": "volatility (%)",
     }
-    
-    ASCENDING_KEYWORDS = [
-        "lowest", "minimum", "min", "worst", "bottom", "least",
-        "avoid", "not consider", "stay away", "don't invest"
-    ]
-    
-    DESCENDING_KEYWORDS = [
-        "highest", "maximum", "max", "best", "top", "most",
-        "recommend", "consider", "invest", "outperform"
-    ]
-    
-    def __init__(self):
-        self.funds = load_funds()
-        for col in ["sharpe_ratio", "cagr_3y", "volatility"]:
-            if col in self.funds.columns:
-                self.funds[col] = pd.to_numeric(self.funds[col], errors='coerce')
-    
-    
-    def _extract_metric(self, query: str) -> Optional[str]:
-        q = query.lower()
-        
-        for keyword, column in self.METRIC_MAPPINGS.items():
-            if keyword in q:
-                return column
-        
-        return None
-    
-    
-    def _extract_direction(self, query: str) -> bool:
-        q = query.lower()
-        
-        has_ascending = any(kw in q for kw in self.ASCENDING_KEYWORDS)
-        has_descending = any(kw in q for kw in self.DESCENDING_KEYWORDS)
-        
-        if has_ascending and not has_descending:
-            return True 
-        else:
-            return False  
-    
-    
-    def _extract_threshold(self, query: str, metric: str) -> Optional[Tuple[str, float]]:
+
+    # words that say nothing about which category is meant
+    _GENERIC_CATEGORY_WORDS = {"fund", "funds", "equity", "scheme"}
+
+    def __init__(self, corpus: Optional[Corpus] = None):
+        self.corpus = corpus if corpus is not None else get_corpus()
+        self.funds = self.corpus.funds
+        n = len(self.funds)
+
+        # float32 column per metric plus its precomputed sort orders; NaNs sort last both ways
+        self.columns: Dict[str, np.ndarray] = {}
+        self.orders: Dict[Tuple[str, bool], np.ndarray] = {}
+        for metric, col in self.METRIC_COLUMNS.items():
+            if col not in self.corpus.numeric:
+                continue
+            values = np.asarray(self.corpus.numeric[col], dtype=np.float32)
+            self.columns[metric] = values
+            self.orders[(metric, True)] = np.argsort(values, kind="stable")
+            self.orders[(metric, False)] = np.argsort(-values, kind="stable")
+
+        self.doc_rows = self.corpus.n_faqs + np.arange(n)
+        self.category_names, self.category_ids, self._category_patterns = self._build_categories()
+
+
+    def _build_categories(self):
+        names = list(dict.fromkeys(self.funds["category"].astype(str)))
+        ids = np.array([names.index(c) for c in self.funds["category"].astype(str)], dtype=np.int32)
+
+        patterns = []
+        for cid, name in enumerate(names):
+            # "Hybrid (Balanced)" -> "hybrid balanced", "hybrid", "balanced"
+            lowered = name.lower()
+            phrases = {lowered}
+            phrases.update(p.strip() for p in re.split(r"[()]", lowered) if p.strip())
+            for phrase in list(phrases):
+                words = [w for w in re.findall(r"[a-z0-9]+", phrase) if w not in self._GENERIC_CATEGORY_WORDS]
+                phrases.discard(phrase)
+                if words:
+                    phrases.add(" ".join(words))
+            for phrase in phrases:
+                patterns.append((re.compile(r"\b" + re.escape(phrase).replace(r"\ ", r"[\s-]+") + r"s?\b"), cid))
+        return names, ids, patterns
+
+
+    def _extract_categories(self, query: str) -> List[int]:
         q = query.lower()
-        
-        patterns = [
-            (r'(?:above|over|greater than|more than|>)\s*(\d+\.?\d*)\s*%?', 'gt'),
-            (r'(?:below|under|less than|<)\s*(\d+\.?\d*)\s*%?', 'lt'),
-            (r'(?:at least|minimum)\s*(\d+\.?\d*)\s*%?', 'gte'),
-            (r'(?:at most|maximum)\s*(\d+\.?\d*)\s*%?', 'lte'),
-        ]
-        
-        for pattern, operator in patterns:
-            match = re.search(pattern, q)
-            if match:
-                value = float(match.group(1))
-                if '%' in q and value > 1:
-                    value = value / 100
-                return (operator, value)
-        
-        return None
-    
-    
-    def _apply_threshold(self, df, metric: str, operator: str, value: float):
+        return sorted({cid for pattern, cid in self._category_patterns if pattern.search(q)})
+
+
+    def matched_categories(self, query: str) -> List[str]:
+        # the fund categories retrieve() filters this query to, by name
+        return [self.category_names[cid] for cid in self._extract_categories(query)]
+
+
+    def _apply_threshold(self, mask: np.ndarray, metric: str, operator: str, value: float) -> np.ndarray:
+        # compare in float32 so "above 18.2" excludes a stored 18.2 (18.2000008 as float32)
+        values, value = self.columns[metric], np.float32(value)
         if operator == 'gt':
-            return df[df[metric] > value]
+            return mask & (values > value)
         elif operator == 'lt':
-            return df[df[metric] < value]
+            return mask & (values < value)
         elif operator == 'gte':
-            return df[df[metric] >= value]
+            return mask & (values >= value)
         elif operator == 'lte':
-            return df[df[metric] <= value]
-        return df
-    
-    
-    def _extract_top_k(self, query: str, default_k: int = 5) -> int:
-        q = query.lower()
-        
-        number_words = {
-            'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
-            'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10
-        }
-        
-        patterns = [
-            r'top\s+(\d+)',
-            r'(\d+)\s+(?:best|worst|top|bottom)',
-            r'top\s+(\w+)',  
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, q)
-            if match:
-                num_str = match.group(1)
-                if num_str in number_words:
-                    return number_words[num_str]
-                try:
-                    return int(num_str)
-                except ValueError:
-                    continue
-        
-        return default_k
-    
-    
+            return mask & (values <= value)
+        return mask
+
+
     def is_numeric_query(self, query: str) -> bool:
-        metric = self._extract_metric(query)
-        if not metric:
-            return False
-        
-        q = query.lower()
-        ranking_keywords = (
-            self.ASCENDING_KEYWORDS + 
-            self.DESCENDING_KEYWORDS + 
-            ["compare", "rank", "sort", "order"]
-        )
-        
-        has_ranking = any(kw in q for kw in ranking_keywords)
-        has_threshold = self._extract_threshold(query, metric) is not None
-        
-        return has_ranking or has_threshold
-    
-    
-    def retrieve(self, query: str, top_k: int = 5) -> List[Dict]:
-        metric = self._extract_metric(query)
-        if not metric:
-            return [] 
-        
-        if metric not in self.funds.columns:
-            return []
-        
-        filtered_df = self.funds.copy()
-        
-        threshold = self._extract_threshold(query, metric)
-        if threshold:
-            operator, value = threshold
-            filtered_df = self._apply_threshold(filtered_df, metric, operator, value)
-            
-            if len(filtered_df) == 0:
-                return []
-        
-        query_k = self._extract_top_k(query, default_k=top_k)
-        
-        ascending = self._extract_direction(query)
-        
-        sorted_df = filtered_df.sort_values(metric, ascending=ascending)
-        
-        top_df = sorted_df.head(query_k)
-        
+        return parse_intent(query).is_numeric
+
+
+    def _rows_to_results(self, rows: np.ndarray, metric: str, score_step: float = 0.1) -> List[Dict]:
+        values = self.columns[metric]
         results = []
-        for idx, (_, row) in enumerate(top_df.iterrows()):
+        for rank, row in enumerate(rows):
+            pos = int(self.doc_rows[row])
+            metric_value = float(str(values[row]))  # float32's shortest repr: 18.2, not 18.200000762939453
             results.append({
-                "score": 1.0 - (idx * 0.1),  # Slight score degradation by rank
+                "score": 1.0 - (rank * score_step),  # Slight score degradation by rank
                 "source": {
-                    "id": row.source,
+                    "id": self.corpus.ids[pos],
                     "type": "fund",
                     "meta": {
-                        "fund_name": row.fund_name,
-                        "rank": idx + 1,
+                        "fund_name": self.corpus.meta[pos]["fund_name"],
+                        "rank": rank + 1,
                         "metric": metric,
-                        "metric_value": float(row[metric])
+                        "metric_value": metric_value
                     }
                 },
-                "text": row.text,
-                "rank": idx + 1,
-                "metric_value": float(row[metric])
+                "text": self.corpus.texts[pos],
+                "rank": rank + 1,
+                "metric_value": metric_value
             })
-        
         return results
-    
-    
+
+
+    def retrieve(self, query: str, top_k: int = 5, intent: Optional[QueryIntent] = None) -> List[Dict]:
+        intent = intent if intent is not None else parse_intent(query)
+        metric = intent.metric
+        if not metric or metric not in self.columns:
+            return []
+
+        mask = ~np.isnan(self.columns[metric])
+        for pred_metric, operator, value in intent.predicates:
+            if pred_metric in self.columns:
+                mask = self._apply_threshold(mask, pred_metric, operator, value)
+
+        categories = self._extract_categories(query)
+        if categories:
+            mask &= np.isin(self.category_ids, categories)
+
+        if not mask.any():
+            return []
+
+        query_k = intent.k if intent.k is not None else top_k
+
+        # walk the presorted order and keep the first k rows that pass every filter
+        order = self.orders[(metric, intent.ascending)]
+        rows = order[mask[order]][:query_k]
+        return self._rows_to_results(rows, metric)
+
+
     def get_all_funds_sorted(self, metric: str = "sharpe_ratio", ascending: bool = False) -> List[Dict]:
-        if metric not in self.funds.columns:
+        if metric not in self.columns:
             return []
-        
-        sorted_df = self.funds.sort_values(metric, ascending=ascending)
-        
-        results = []
-        for idx, (_, row) in enumerate(sorted_df.iterrows()):
-            results.append({
-                "score": 1.0,
-                "source": {
-                    "id": row.source,
-                    "type": "fund",
-                    "meta": {
-                        "fund_name": row.fund_name,
-                        "rank": idx + 1,
-                        "metric": metric,
-                        "metric_value": float(row[metric])
-                    }
-                },
-                "text": row.text,
-                "rank": idx + 1,
-                "metric_value": float(row[metric])
-            })
-        
-        return results
\ No newline at end of file
+
+        order = self.orders[(metric, ascending)]
+        rows = order[~np.isnan(self.columns[metric][order])]
+        return self._rows_to_results(rows, metric, score_step=0.0)
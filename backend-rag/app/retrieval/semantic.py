@@ -1,55 +1,147 @@
+import json
+import os
 import faiss
 import numpy as np
-from ..ingestion.load_faqs import load_faqs
-from ..ingestion.load_funds import load_funds
-from ..ingestion.embed_utils import get_embedding
-from app.settings import FAISS_INDEX_PATH
+from typing import List, Optional
+from ..ingestion.corpus import Corpus, get_corpus
+from ..ingestion.bundle import get_bundle
+from ..ingestion.embed_utils import get_embedding, get_embeddings
+from ..core.metrics import span
+from .vector_index import build_index, configure_search, index_config, resolve_index_type
+from app.settings import FAISS_INDEX_PATH, FAISS_MANIFEST_PATH, EMBED_MODEL
+
+MANIFEST_VERSION = 1
 
 
 class SemanticRetriever:
-    def __init__(self):
-        self.faqs = load_faqs()
-        self.funds = load_funds()
-        self.corpus = list(self.faqs["text"]) + list(self.funds["text"])
-        self.ids = list(self.faqs["source"]) + list(self.funds["source"])
-        self.index = None
-        self._build_index()
+    def __init__(self, corpus: Optional[Corpus] = None, index=None):
+        self.corpus = corpus if corpus is not None else get_corpus()
+        bundle = get_bundle()
+        if index is None and bundle is not None and bundle.corpus is self.corpus:
+            index = bundle.index
+        self.index = index
+        if self.index is None:
+            self._build_index()
+
+
+    def _load_existing(self):
+        if not (FAISS_INDEX_PATH.exists() and FAISS_MANIFEST_PATH.exists()):
+            return None, None
+        try:
+            index = faiss.read_index(str(FAISS_INDEX_PATH))
+            with open(FAISS_MANIFEST_PATH) as f:
+                manifest = json.load(f)
+        except Exception:
+            return None, None
+        if manifest.get("version") != MANIFEST_VERSION or manifest.get("model") != EMBED_MODEL:
+            return None, None
+        if manifest.get("index_config") != index_config():
+            return None, None
+        if index.ntotal != len(manifest.get("doc_hashes", [])):
+            return None, None
+        return configure_search(index), manifest
+
+
+    def _save(self, index):
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "model": EMBED_MODEL,
+            "index_config": index_config(),
+            "index_type": resolve_index_type(len(self.corpus)),
+            "fingerprint": self.corpus.fingerprint,
+            "doc_hashes": self.corpus.doc_hashes,
+        }
+        tmp_index = f"{FAISS_INDEX_PATH}.tmp"
+        tmp_manifest = f"{FAISS_MANIFEST_PATH}.tmp"
+        faiss.write_index(index, tmp_index)
+        with open(tmp_manifest, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_index, FAISS_INDEX_PATH)
+        os.replace(tmp_manifest, FAISS_MANIFEST_PATH)
+
+
+    def _embed_rows(self, start: int = 0) -> np.ndarray:
+        xb = get_embeddings(self.corpus.texts[start:])
+        faiss.normalize_L2(xb)
+        return xb
 
 
     def _build_index(self):
-        if FAISS_INDEX_PATH.exists():
-            try:
-                self.index = faiss.read_index(str(FAISS_INDEX_PATH))
+        index, manifest = self._load_existing()
+        if index is not None:
+            if manifest["fingerprint"] == self.corpus.fingerprint:
+                self.index = index
                 return
-            except Exception:
-                pass
-        embs = [get_embedding(t).astype(np.float32) for t in self.corpus]
-        dim = embs[0].shape[0]
-        xb = np.vstack(embs)
-        index = faiss.IndexFlatIP(dim) 
-        faiss.normalize_L2(xb)
-        index.add(xb)
-        faiss.write_index(index, str(FAISS_INDEX_PATH))
+
+            old_hashes = manifest["doc_hashes"]
+            n_old = len(old_hashes)
+            appended = n_old <= len(self.corpus) and self.corpus.doc_hashes[:n_old] == old_hashes
+            # an index that outgrew the flat fallback is rebuilt as the configured ANN type
+            same_type = manifest.get("index_type") == resolve_index_type(len(self.corpus))
+            if appended and same_type:
+                # rows were only appended: embed and add just the new ones
+                if n_old < len(self.corpus):
+                    index.add(self._embed_rows(n_old))
+                self._save(index)
+                self.index = index
+                return
+
+        # rows changed or were removed: rebuild. Embeddings are content-addressed
+        # in the disk cache, so only added or edited rows are actually encoded.
+        index = build_index(self._embed_rows())
+        self._save(index)
         self.index = index
 
 
-    def retrieve(self, query: str, top_k: int = 5):
-        q_emb = get_embedding(query).astype(np.float32)
-        faiss.normalize_L2(np.expand_dims(q_emb, axis=0))
-        D, I = self.index.search(np.expand_dims(q_emb, axis=0), top_k)
+    def _to_results(self, scores, idxs):
         results = []
-        for score, idx in zip(D[0], I[0]):
+        for score, idx in zip(scores, idxs):
             if idx < 0:
                 continue
-            text = self.corpus[idx]
-            source_id = self.ids[idx]
-            typ = "faq" if str(source_id).startswith("faq_") else "fund"
-            meta = {}
-            if typ == "faq":
-                row = self.faqs[self.faqs["source"] == source_id].iloc[0]
-                meta = {"question": row.question}
-            else:
-                row = self.funds[self.funds["source"] == source_id].iloc[0]
-                meta = {"fund_name": row.fund_name}
-            results.append({"score": float(score), "source": {"id": source_id, "type": typ, "meta": meta}, "text": text})
-        return results
\ No newline at end of file
+            results.append({"score": float(score), "source": self.corpus.source(idx), "text": self.corpus.texts[idx]})
+        return results
+
+
+    def embed_query(self, query: str) -> np.ndarray:
+        with span("semantic.embed"):
+            q_emb = get_embedding(query).astype(np.float32)
+        faiss.normalize_L2(np.expand_dims(q_emb, axis=0))
+        return q_emb
+
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        # one encode call for the whole batch (cached rows are not re-encoded)
+        with span("semantic.embed_batch"):
+            q_embs = get_embeddings(queries)  # fresh contiguous float32, safe to normalize in place
+        faiss.normalize_L2(q_embs)
+        return q_embs
+
+
+    def search(self, query: str, top_k: int = 5, q_emb: Optional[np.ndarray] = None):
+        # (doc rows, scores), best first; FAISS pads short result lists with -1
+        if q_emb is None:
+            q_emb = self.embed_query(query)
+        with span("semantic.faiss"):
+            D, I = self.index.search(np.expand_dims(q_emb, axis=0), top_k)
+        keep = I[0] >= 0
+        return I[0][keep], D[0][keep]
+
+
+    def search_batch(self, queries: List[str], top_k: int = 5, q_embs: Optional[np.ndarray] = None):
+        if not queries:
+            return []
+        if q_embs is None:
+            q_embs = self.embed_queries(queries)
+        with span("semantic.faiss_batch"):
+            D, I = self.index.search(np.ascontiguousarray(q_embs, dtype=np.float32), top_k)
+        keep = I >= 0
+        return [(I[i][keep[i]], D[i][keep[i]]) for i in range(len(queries))]
+
+
+    def retrieve(self, query: str, top_k: int = 5, q_emb: Optional[np.ndarray] = None):
+        idxs, scores = self.search(query, top_k, q_emb)
+        return self._to_results(scores, idxs)
+
+
+    def retrieve_batch(self, queries: List[str], top_k: int = 5, q_embs: Optional[np.ndarray] = None):
+        return [self._to_results(scores, idxs) for idxs, scores in self.search_batch(queries, top_k, q_embs)]
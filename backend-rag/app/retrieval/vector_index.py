@@ -0,0 +1,65 @@
+import faiss
+import numpy as np
+from app.settings import (
+    FAISS_INDEX_TYPE, FAISS_ANN_MIN_DOCS, FAISS_IVF_NLIST, FAISS_NPROBE,
+    FAISS_HNSW_M, FAISS_HNSW_EF_CONSTRUCTION, FAISS_HNSW_EF_SEARCH, FAISS_PQ_M, FAISS_PQ_NBITS,
+)
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+
+def resolve_index_type(n_docs: int, index_type: str = FAISS_INDEX_TYPE) -> str:
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type {index_type!r}, expected one of {INDEX_TYPES}")
+    # below this size an exact scan is as fast as any ANN structure and
+    # IVF/PQ would not have enough points to train on
+    if n_docs < FAISS_ANN_MIN_DOCS:
+        return "flat"
+    return index_type
+
+
+def index_config(index_type: str = FAISS_INDEX_TYPE) -> dict:
+    # build-time parameters; a change here invalidates a persisted index
+    if index_type == "ivf_flat":
+        return {"type": index_type, "nlist": FAISS_IVF_NLIST}
+    if index_type == "hnsw":
+        return {"type": index_type, "m": FAISS_HNSW_M, "ef_construction": FAISS_HNSW_EF_CONSTRUCTION}
+    if index_type == "ivf_pq":
+        return {"type": index_type, "nlist": FAISS_IVF_NLIST, "pq_m": FAISS_PQ_M, "pq_nbits": FAISS_PQ_NBITS}
+    return {"type": index_type}
+
+
+def build_index(xb: np.ndarray, index_type: str = FAISS_INDEX_TYPE, nlist: int = FAISS_IVF_NLIST,
+                hnsw_m: int = FAISS_HNSW_M, ef_construction: int = FAISS_HNSW_EF_CONSTRUCTION,
+                pq_m: int = FAISS_PQ_M, pq_nbits: int = FAISS_PQ_NBITS):
+    n, dim = xb.shape
+    index_type = resolve_index_type(n, index_type)
+
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+    else:
+        # faiss wants ~39 training points per list
+        nlist = max(1, min(nlist, n // 39))
+        quantizer = faiss.IndexFlatIP(dim)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            if dim % pq_m != 0:
+                raise ValueError(f"FAISS_PQ_M={pq_m} must divide the embedding dimension {dim}")
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, pq_nbits, faiss.METRIC_INNER_PRODUCT)
+        index.train(xb)
+
+    index.add(xb)
+    configure_search(index)
+    return index
+
+
+def configure_search(index, nprobe: int = FAISS_NPROBE, ef_search: int = FAISS_HNSW_EF_SEARCH):
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = nprobe
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+    return index
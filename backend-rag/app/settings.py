@@ -11,21 +11,128 @@ DATA_DIR.mkdir(parents=True, exist_ok=True)
 # Embedding model
 EMBED_MODEL = "all-MiniLM-L6-v2"
 
+EMBED_BATCH_SIZE = 64
+
 # FAISS file
 FAISS_INDEX_PATH = DATA_DIR / "vector_store.faiss"
+FAISS_MANIFEST_PATH = DATA_DIR / "vector_store.manifest.json"
+
+# Prebuilt retrieval artifacts (scripts/build_bundle.py); workers fall back to
+# building in-process when no bundle matches the current CSVs and settings
+BUNDLE_DIR = DATA_DIR / "bundle"
+USE_BUNDLE = True
+
+# FAISS index backend: flat (exact) / ivf_flat / hnsw / ivf_pq
+FAISS_INDEX_TYPE = "flat"
+FAISS_ANN_MIN_DOCS = 5000 # smaller corpora always use an exact flat index
+FAISS_IVF_NLIST = 1024 # inverted lists; capped to len(corpus) // 39 at build time
+FAISS_NPROBE = 16 # lists scanned per query (IVF)
+FAISS_HNSW_M = 32
+FAISS_HNSW_EF_CONSTRUCTION = 200
+FAISS_HNSW_EF_SEARCH = 64
+FAISS_PQ_M = 48 # sub-quantizers; must divide the embedding dimension
+FAISS_PQ_NBITS = 8
 EMBEDDINGS_CACHE_PATH = DATA_DIR / "embedding_cache"
 
 # DiskCache directory
 DISKCACHE_DIR = str(EMBEDDINGS_CACHE_PATH)
+EMBED_CACHE_SIZE_LIMIT = 512 * 1024 ** 2 # bytes; least-recently-used entries are evicted past this
+
+# Retrieval result cache (in front of every retriever)
+RETRIEVAL_CACHE_ENABLED = True
+RETRIEVAL_CACHE_MAX_ENTRIES = 4096 # in-process LRU entries per worker
+RETRIEVAL_CACHE_DISK = False # add a diskcache tier shared by the workers on this host
+RETRIEVAL_CACHE_DIR = str(DATA_DIR / "retrieval_cache")
+RETRIEVAL_CACHE_DISK_SIZE_LIMIT = 256 * 1024 ** 2 # bytes
 
 # OpenRouter
 OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY")
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+OPENROUTER_BASE_URL = os.environ.get("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1") # e.g. scripts/stub_openrouter.py
 LLM_MODEL = "openai/gpt-oss-120b"
 MAX_TOKEN_OUTPUT = 2200
+LLM_TIMEOUT = 60.0 # seconds per attempt
+LLM_MAX_CONNECTIONS = 32 # pooled keep-alive connections to OpenRouter per worker
+LLM_KEEPALIVE_EXPIRY = 60.0
+
+# LLM transport resilience (app/core/llm_transport.py)
+LLM_FALLBACK_MODELS = ["openai/gpt-oss-20b"] # tried in order once the routed model's retries are used up or its breaker is open
+LLM_MAX_RETRIES = 2 # extra attempts per model on 429 / 5xx / timeouts / connection errors
+LLM_BACKOFF_BASE = 0.5 # seconds; retry n sleeps uniform(0, base * 2**n), or Retry-After if longer
+LLM_BACKOFF_MAX = 8.0 # seconds, cap on the jittered backoff
+LLM_RETRY_AFTER_MAX = 20.0 # a longer Retry-After moves on to the next model instead of waiting
+LLM_HEDGE_ENABLED = False # send a second copy of a slow request; costs tokens on every hedge
+LLM_HEDGE_QUANTILE = 0.95 # hedge once a request outlives this quantile of recent latencies
+LLM_HEDGE_MIN_DELAY = 2.0 # seconds, never hedge sooner
+LLM_HEDGE_MIN_SAMPLES = 20 # recent successful calls needed before hedging
+LLM_HEDGE_WINDOW = 200 # recent latencies kept per route and model
+LLM_BREAKER_WINDOW = 20 # recent attempts per model the circuit breaker looks at
+LLM_BREAKER_MIN_ATTEMPTS = 5 # attempts in the window before the breaker can open
+LLM_BREAKER_FAILURE_RATE = 0.6 # share of failed attempts in the window that opens the circuit
+LLM_BREAKER_COOLDOWN = 30.0 # seconds a circuit stays open before one probe request is let through
+# Prompt caching: the system prompt is the first message and byte-identical on
+# every call, so providers that cache prefixes automatically (OpenAI, DeepSeek,
+# ...) reuse it; models matching these prefixes need an explicit breakpoint
+LLM_CACHE_CONTROL_MODELS = ("anthropic/", "google/gemini")
+
+FAST_PATH_ENABLED = True # answer plain numeric rankings ("top 3 funds by sharpe") from a template, without the LLM
+
+# LLM routing: the call parameters are picked per query from its parsed intent
+# and what retrieval found (see app/core/llm_routing.py). "reasoning" is True
+# (provider default effort), False (off) or an effort: "low" / "medium" / "high".
+LLM_ROUTING_ENABLED = True # False: every query takes the "default" route
+LLM_ROUTES = {
+    "definition": {"model": LLM_MODEL, "reasoning": "low", "max_tokens": 800}, # "explain the sharpe ratio", or only FAQs retrieved
+    "numeric": {"model": LLM_MODEL, "reasoning": "low", "max_tokens": 1200}, # ranked/filtered funds, few to explain
+    "comparison": {"model": LLM_MODEL, "reasoning": "medium", "max_tokens": MAX_TOKEN_OUTPUT}, # numeric, many funds
+    "general": {"model": LLM_MODEL, "reasoning": "medium", "max_tokens": MAX_TOKEN_OUTPUT},
+    "no_context": {"model": LLM_MODEL, "reasoning": "low", "max_tokens": 400}, # nothing retrieved
+    "default": {"model": LLM_MODEL, "reasoning": True, "max_tokens": MAX_TOKEN_OUTPUT},
+}
+LLM_ROUTE_COMPARISON_MIN_FUNDS = 4 # numeric queries with at least this many funds retrieved are comparisons
+
+# Context packing: the FAQ/FUND blocks sent to the LLM are packed by relevance
+# up to the model's token budget
+CONTEXT_TOKENIZER = "o200k_base" # tiktoken encoding; falls back to a chars/4 estimate if unavailable
+CONTEXT_TOKEN_BUDGETS = { # context tokens per model
+    "openai/gpt-oss-120b": 2500,
+}
+CONTEXT_TOKEN_BUDGET_DEFAULT = 2500
+
+# Semantic answer cache in front of the LLM
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_MAX_ENTRIES = 2048
+ANSWER_CACHE_TTL = 6 * 3600 # seconds
+ANSWER_CACHE_SIMILARITY = 0.95 # min cosine similarity between query embeddings
+
+# Concurrency
+RETRIEVAL_WORKERS = 4 # threads for CPU-bound retrieval per worker
+HYBRID_FANOUT_WORKERS = 8 # threads running lexical/semantic/numeric branches of a hybrid query
+
+# Retrieval-only endpoint
+RETRIEVE_MAX_DEPTH = 100 # offset + k accepted by GET /retrieve
+
+# Batch endpoint
+BATCH_MAX_QUERIES = 256 # items accepted per /query/batch request
+BATCH_LLM_CONCURRENCY = 8 # LLM calls in flight per batch request
 
 # Retrieval tuning
 TOP_K_LEXICAL = 10
 TOP_K_SEMANTIC = 10
 FAQ_TOP_K = 2
-HYBRID_ALPHA = 0.5 # weight for semantic when fusing scores (0 to 1)
\ No newline at end of file
+HYBRID_ALPHA = 0.5 # weight for semantic when fusing scores (0 to 1)
+HYBRID_FUSION = "alpha" # alpha / minmax / zscore / rrf, see app/retrieval/fusion.py
+HYBRID_LEXICAL_DEPTH = 10 # BM25 candidates fused per hybrid query, independent of the final k
+HYBRID_SEMANTIC_DEPTH = 10 # FAISS candidates fused per hybrid query
+HYBRID_RRF_K = 60 # rank offset for reciprocal rank fusion
+
+# Lexical analyzer (shared by BM25 indexing and querying)
+LEXICAL_LOWERCASE = True
+LEXICAL_STOPWORDS = True
+LEXICAL_STEMMING = True
+LEXICAL_SYNONYMS = { # canonical term -> variants folded into it
+    "cagr": ["return", "returns", "growth"],
+    "volatility": ["risk", "risky", "volatile"],
+}
+
+# Query intent parsing
+INTENT_CACHE_SIZE = 4096 # parsed queries memoized per worker
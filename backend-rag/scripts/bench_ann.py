@@ -0,0 +1,71 @@
+# Recall@k vs. latency of the FAISS backends against the exact flat index,
+# on synthetic clustered unit vectors shaped like the sentence embeddings.
+#
+#   cd backend-rag && python -m scripts.bench_ann --docs 100000 --k 10
+import argparse
+import time
+import faiss
+import numpy as np
+from app.retrieval.vector_index import build_index, configure_search
+
+SWEEPS = {
+    "ivf_flat": ("nprobe", [1, 4, 16, 64]),
+    "hnsw": ("ef_search", [16, 32, 64, 128]),
+    "ivf_pq": ("nprobe", [4, 16, 64]),
+}
+
+
+def synthetic(n: int, dim: int, clusters: int, rng) -> np.ndarray:
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    x = centers[rng.integers(0, clusters, n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    faiss.normalize_L2(x)
+    return x
+
+
+def timed_search(index, xq, k):
+    start = time.perf_counter()
+    for q in xq:
+        index.search(q[None, :], k)
+    per_query_ms = (time.perf_counter() - start) * 1000 / len(xq)
+    _, I = index.search(xq, k)
+    return I, per_query_ms
+
+
+def recall(found, truth, k):
+    hits = sum(len(set(f[:k]) & set(t[:k])) for f, t in zip(found, truth))
+    return hits / (len(truth) * k)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    xb = synthetic(args.docs, args.dim, max(8, args.docs // 500), rng)
+    xq = synthetic(args.queries, args.dim, max(8, args.docs // 500), rng)
+
+    start = time.perf_counter()
+    flat = build_index(xb, "flat")
+    build_s = time.perf_counter() - start
+    truth, flat_ms = timed_search(flat, xq, args.k)
+
+    print(f"{args.docs} docs, {args.queries} queries, recall@{args.k} vs flat")
+    print(f"{'index':<10} {'param':<14} {'build s':>8} {'recall':>7} {'ms/query':>9}")
+    print(f"{'flat':<10} {'-':<14} {build_s:>8.2f} {1.0:>7.3f} {flat_ms:>9.3f}")
+
+    for index_type, (param, values) in SWEEPS.items():
+        start = time.perf_counter()
+        index = build_index(xb, index_type)
+        build_s = time.perf_counter() - start
+        for value in values:
+            configure_search(index, **{param: value})
+            found, ms = timed_search(index, xq, args.k)
+            print(f"{index_type:<10} {f'{param}={value}':<14} {build_s:>8.2f} {recall(found, truth, args.k):>7.3f} {ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
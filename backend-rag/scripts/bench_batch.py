@@ -0,0 +1,100 @@
+# Throughput of POST /query/batch vs. a loop of POST /query calls, in-process
+# against the ASGI app with OpenRouter replaced by a stub that answers after
+# --llm-latency seconds. Also reports retrieval-only queries/sec for the
+# single-query loop vs. retrieve_batch. Each run gets its own fresh queries so
+# neither side is served from the embedding cache; the answer cache is off.
+#
+#   cd backend-rag && python -m scripts.bench_batch --n 200 --llm-latency 0.2
+import argparse
+import asyncio
+import json
+import time
+import httpx
+from app.main import app
+from app.api import routes
+from app.core import llm
+from app.ingestion.corpus import get_corpus
+
+TEMPLATES = [
+    "what does {} mean",
+    "tell me about {}",
+    "is {} a good fund for beginners",
+    "top 3 funds with highest sharpe like {}",
+    "compare {} with large cap funds on returns",
+]
+MODES = ["hybrid", "lexical", "semantic"]
+
+
+def make_queries(n: int, run: str):
+    corpus = get_corpus()
+    names = [m.get("fund_name") or m.get("question") for m in corpus.meta]
+    return [
+        (f"{TEMPLATES[i % len(TEMPLATES)].format(names[i % len(names)])} ({run} {i})", MODES[i % len(MODES)])
+        for i in range(n)
+    ]
+
+
+def stub_client(latency: float) -> httpx.AsyncClient:
+    async def handler(request):
+        await asyncio.sleep(latency)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "stub answer"}}], "usage": {}})
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://stub")
+
+
+def retrieval_qps(n: int):
+    single = make_queries(n, "ret-single")
+    start = time.perf_counter()
+    for q, mode in single:
+        routes._retrieve_with_embedding(q, mode)
+    single_qps = n / (time.perf_counter() - start)
+
+    batch = make_queries(n, "ret-batch")
+    start = time.perf_counter()
+    routes._retrieve_batch([q for q, _ in batch], [m for _, m in batch])
+    batch_qps = n / (time.perf_counter() - start)
+    return single_qps, batch_qps
+
+
+async def end_to_end_qps(n: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=None) as client:
+        single = make_queries(n, "e2e-single")
+        start = time.perf_counter()
+        for q, mode in single:
+            resp = await client.post("/query", json={"query": q, "mode": mode})
+            resp.raise_for_status()
+        single_qps = n / (time.perf_counter() - start)
+
+        batch = make_queries(n, "e2e-batch")
+        start = time.perf_counter()
+        resp = await client.post("/query/batch", json={"items": [{"query": q, "mode": m} for q, m in batch]})
+        resp.raise_for_status()
+        lines = [json.loads(line) for line in resp.text.splitlines()]
+        batch_qps = n / (time.perf_counter() - start)
+        errors = sum("error" in line for line in lines)
+    return single_qps, batch_qps, errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    routes.ANSWER_CACHE_ENABLED = False
+    llm.OPENROUTER_API_KEY = llm.OPENROUTER_API_KEY or "stub"
+    llm._client = stub_client(args.llm_latency)
+
+    ret_single, ret_batch = retrieval_qps(args.n)
+    e2e_single, e2e_batch, errors = asyncio.run(end_to_end_qps(args.n))
+
+    print(f"{args.n} queries, stub LLM latency {args.llm_latency * 1000:.0f} ms")
+    print(f"{'':>20} {'loop q/s':>10} {'batch q/s':>10} {'speedup':>8}")
+    print(f"{'retrieval only':>20} {ret_single:>10.1f} {ret_batch:>10.1f} {ret_batch / ret_single:>7.1f}x")
+    print(f"{'end to end':>20} {e2e_single:>10.1f} {e2e_batch:>10.1f} {e2e_batch / e2e_single:>7.1f}x")
+    if errors:
+        print(f"batch items with errors: {errors}")
+
+
+if __name__ == "__main__":
+    main()
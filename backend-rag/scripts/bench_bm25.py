@@ -0,0 +1,69 @@
+# Inverted-index BM25 (app.retrieval.bm25) vs. rank_bm25's get_scores +
+# argsort, on synthetic Zipf-distributed corpora.
+#
+#   cd backend-rag && python -m scripts.bench_bm25 --sizes 10000 100000 1000000
+import argparse
+import time
+import numpy as np
+from app.retrieval.bm25 import BM25Index
+
+
+def synthetic_corpus(n_docs: int, vocab_size: int, doc_len: int, rng):
+    vocab = np.array([f"t{i}" for i in range(vocab_size)])
+    ranks = np.arange(1, vocab_size + 1)
+    p = 1.0 / ranks
+    p /= p.sum()
+    lengths = rng.integers(doc_len // 2, doc_len * 3 // 2, n_docs)
+    words = vocab[rng.choice(vocab_size, size=lengths.sum(), p=p)]
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    words = words.tolist()
+    return [words[bounds[i]:bounds[i + 1]] for i in range(n_docs)], vocab, p
+
+
+def per_query_ms(fn, queries):
+    start = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--max-baseline-docs", type=int, default=100_000,
+                        help="skip rank_bm25 above this size (it needs minutes and GBs at 1M)")
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    print(f"{'docs':>9} {'engine':<10} {'build s':>8} {'ms/query':>9} {'top-k agree':>12}")
+    for n in args.sizes:
+        docs, vocab, p = synthetic_corpus(n, 50_000, 40, rng)
+        queries = [vocab[rng.choice(len(vocab), size=rng.integers(2, 6), p=p)].tolist() for _ in range(args.queries)]
+
+        start = time.perf_counter()
+        index = BM25Index.build(docs)
+        build_s = time.perf_counter() - start
+        ms = per_query_ms(lambda q: index.search(q, args.k), queries)
+        print(f"{n:>9} {'inverted':<10} {build_s:>8.2f} {ms:>9.3f} {'-':>12}")
+
+        if n > args.max_baseline_docs:
+            continue
+        from rank_bm25 import BM25Okapi
+        start = time.perf_counter()
+        baseline = BM25Okapi(docs)
+        build_s = time.perf_counter() - start
+
+        def legacy(q):
+            return baseline.get_scores(q).argsort()[::-1][:args.k]
+
+        ms = per_query_ms(legacy, queries)
+        agree = np.mean([
+            len(set(legacy(q)) & set(index.search(q, args.k)[0])) / args.k for q in queries
+        ])
+        print(f"{n:>9} {'rank_bm25':<10} {build_s:>8.2f} {ms:>9.3f} {agree:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Hybrid fusion: cost of the old dict-of-dicts alpha blend vs. the array
+# fusion in app.retrieval.fusion at deep candidate lists, then recall@3 / MRR
+# and per-query latency of every fusion method and candidate depth on the
+# labelled queries from eval_lexical.
+#
+#   cd backend-rag && python -m scripts.bench_fusion
+import time
+import numpy as np
+from app.retrieval.fusion import FUSION_METHODS, fuse
+from app.retrieval.hybrid import HybridRetriever
+from scripts.eval_lexical import LABELLED_QUERIES
+
+
+def legacy_alpha(lex_res, sem_res, alpha, top_k):
+    # HybridRetriever's fusion before app.retrieval.fusion
+    lex_scores = [r["score"] for r in lex_res]
+    sem_scores = [r["score"] for r in sem_res]
+    max_lex = max(lex_scores) if lex_scores else 1.0
+    max_sem = max(sem_scores) if sem_scores else 1.0
+    candidates = {}
+    for r in lex_res:
+        candidates[r["source"]["id"]] = {"source": r["source"], "text": r["text"], "lex_score": r["score"], "sem_score": 0.0}
+    for r in sem_res:
+        sid = r["source"]["id"]
+        if sid not in candidates:
+            candidates[sid] = {"source": r["source"], "text": r["text"], "lex_score": 0.0, "sem_score": r["score"]}
+        else:
+            candidates[sid]["sem_score"] = r["score"]
+    fused = []
+    for sid, v in candidates.items():
+        norm_lex = v["lex_score"] / max_lex if max_lex else 0.0
+        norm_sem = v["sem_score"] / max_sem if max_sem else 0.0
+        fused.append({"score": float((1 - alpha) * norm_lex + alpha * norm_sem), "source": v["source"],
+                      "text": v["text"], "lex_score": v["lex_score"], "sem_score": v["sem_score"]})
+    return sorted(fused, key=lambda x: x["score"], reverse=True)[:top_k]
+
+
+def synthetic_hits(rng, n_docs, depth):
+    # two branches sharing a third of their candidates, in unrelated orders
+    shared = depth // 3
+    pool = rng.choice(n_docs, 2 * depth - shared, replace=False)
+    lex_ids, sem_ids = rng.permutation(pool[:depth]), rng.permutation(pool[depth - shared:])
+    return lex_ids, np.sort(rng.gamma(2.0, 2.0, depth))[::-1], sem_ids, np.sort(rng.random(depth))[::-1]
+
+
+def as_results(ids, scores):
+    # what the retrievers used to materialize for every candidate
+    return [{"score": float(s), "source": {"id": f"D{i}", "type": "fund", "meta": {}}, "text": ""} for i, s in zip(ids, scores)]
+
+
+def cost(repeats: int = 200, n_docs: int = 100_000, top_k: int = 10):
+    rng = np.random.default_rng(0)
+    print(f"fusion cost, {n_docs} docs, final k={top_k}, us/query")
+    print(f"{'depth':>6} {'legacy alpha':>13} " + " ".join(f"{m:>8}" for m in FUSION_METHODS))
+    for depth in [10, 100, 1000]:
+        hits = [synthetic_hits(rng, n_docs, depth) for _ in range(repeats)]
+        start = time.perf_counter()
+        for lex_ids, lex_s, sem_ids, sem_s in hits:
+            legacy_alpha(as_results(lex_ids, lex_s), as_results(sem_ids, sem_s), 0.5, top_k)
+        legacy = (time.perf_counter() - start) * 1e6 / repeats
+        row = []
+        for method in FUSION_METHODS:
+            start = time.perf_counter()
+            for lex_ids, lex_s, sem_ids, sem_s in hits:
+                fuse(lex_ids, lex_s, sem_ids, sem_s, method=method, top_k=top_k)
+            row.append((time.perf_counter() - start) * 1e6 / repeats)
+        print(f"{depth:>6} {legacy:>13.1f} " + " ".join(f"{us:>8.1f}" for us in row))
+
+
+def quality(k: int = 3):
+    hybrid = HybridRetriever()
+    corpus = hybrid.corpus
+    queries = list(LABELLED_QUERIES)
+    q_embs = hybrid.sem.embed_queries(queries)
+    print(f"\nquality on {len(queries)} labelled queries, {len(corpus)} docs")
+    print(f"{'method':>8} {'depth':>6} {f'recall@{k}':>10} {'mrr@10':>8} {'us/query':>9}")
+    for method in FUSION_METHODS:
+        if method == "max":
+            continue  # only used for FAQ definition queries
+        for depth in [10, 50, 1000]:
+            hybrid.lex_depth = hybrid.sem_depth = depth
+            hits = total = 0
+            rr = 0.0
+            elapsed = 0.0
+            for query, q_emb in zip(queries, q_embs):
+                start = time.perf_counter()
+                lex_hit = hybrid.lex.search(query, depth)
+                sem_hit = hybrid.sem.search(query, depth, q_emb=q_emb)
+                results = hybrid._fuse_general(lex_hit, sem_hit, 10, 0.5, method)
+                elapsed += time.perf_counter() - start
+                ids = [r["source"]["id"] for r in results]
+                relevant = set(LABELLED_QUERIES[query])
+                hits += len(set(ids[:k]) & relevant)
+                total += min(len(relevant), k)
+                rr += next((1.0 / (rank + 1) for rank, sid in enumerate(ids) if sid in relevant), 0.0)
+            print(f"{method:>8} {depth:>6} {hits / total:>10.3f} {rr / len(queries):>8.3f} "
+                  f"{elapsed * 1e6 / len(queries):>9.1f}")
+
+
+if __name__ == "__main__":
+    cost()
+    quality()
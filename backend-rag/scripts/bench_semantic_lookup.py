@@ -0,0 +1,66 @@
+# Per-query cost of turning FAISS hits into result dicts, old pandas
+# boolean-mask lookup vs. the corpus registry's positional arrays.
+#
+#   cd backend-rag && python -m scripts.bench_semantic_lookup
+import time
+import numpy as np
+import pandas as pd
+from app.ingestion.corpus import Corpus
+from app.retrieval.semantic import SemanticRetriever
+
+
+def synthetic_corpus(n: int) -> Corpus:
+    n_faqs = n // 2
+    faqs = pd.DataFrame({
+        "source": [f"faq_{i}" for i in range(n_faqs)],
+        "question": [f"question {i}?" for i in range(n_faqs)],
+    })
+    faqs["answer"] = "answer"
+    faqs["text"] = faqs["question"] + "\nanswer"
+    funds = pd.DataFrame({
+        "source": [f"F{i:06d}" for i in range(n - n_faqs)],
+        "fund_name": [f"Fund {i}" for i in range(n - n_faqs)],
+    })
+    funds["text"] = "Fund " + funds["source"] + " " + funds["fund_name"]
+    return Corpus(faqs=faqs, funds=funds)
+
+
+def legacy_lookup(corpus: Corpus, scores, idxs):
+    faqs, funds = corpus.faqs, corpus.funds
+    results = []
+    for score, idx in zip(scores, idxs):
+        source_id = corpus.ids[idx]
+        typ = "faq" if str(source_id).startswith("faq_") else "fund"
+        if typ == "faq":
+            row = faqs[faqs["source"] == source_id].iloc[0]
+            meta = {"question": row.question}
+        else:
+            row = funds[funds["source"] == source_id].iloc[0]
+            meta = {"fund_name": row.fund_name}
+        results.append({"score": float(score), "source": {"id": source_id, "type": typ, "meta": meta}, "text": corpus.texts[idx]})
+    return results
+
+
+def per_query_us(fn, hits, repeats):
+    start = time.perf_counter()
+    for scores, idxs in hits:
+        fn(scores, idxs)
+    return (time.perf_counter() - start) * 1e6 / repeats
+
+
+def main(top_k: int = 10, repeats: int = 50):
+    rng = np.random.default_rng(0)
+    print(f"top_k={top_k}, {repeats} queries per size")
+    print(f"{'docs':>8} {'pandas us/q':>12} {'registry us/q':>14}")
+    for n in [1_000, 10_000, 100_000]:
+        corpus = synthetic_corpus(n)
+        retriever = SemanticRetriever.__new__(SemanticRetriever)
+        retriever.corpus = corpus
+        hits = [(rng.random(top_k), rng.integers(0, n, top_k)) for _ in range(repeats)]
+        legacy = per_query_us(lambda s, i: legacy_lookup(corpus, s, i), hits, repeats)
+        current = per_query_us(retriever._to_results, hits, repeats)
+        print(f"{n:>8} {legacy:>12.1f} {current:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
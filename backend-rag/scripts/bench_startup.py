@@ -0,0 +1,41 @@
+# Measures worker boot cost: wall time to import the app (which builds every
+# retriever), resident memory, and how many times the CSVs were parsed.
+#
+#   cd backend-rag && python -m scripts.bench_startup
+import resource
+import time
+import pandas as pd
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * resource.getpagesize() / 1024 ** 2
+
+
+def main():
+    csv_reads = 0
+    read_csv = pd.read_csv
+
+    def counting_read_csv(*args, **kwargs):
+        nonlocal csv_reads
+        csv_reads += 1
+        return read_csv(*args, **kwargs)
+
+    pd.read_csv = counting_read_csv
+
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    import app.main  # noqa: F401
+    elapsed = time.perf_counter() - start
+    rss_after = _rss_mb()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    print(f"boot time       : {elapsed:.3f}s")
+    print(f"csv reads       : {csv_reads}")
+    print(f"rss before/after: {rss_before:.1f} MB / {rss_after:.1f} MB (+{rss_after - rss_before:.1f} MB)")
+    print(f"peak rss        : {peak:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
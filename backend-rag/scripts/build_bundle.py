@@ -0,0 +1,17 @@
+# Builds the versioned retrieval bundle (postings, FAISS index,
+# document and numeric tables) that workers memory-map at startup. Run after
+# editing the CSVs or retrieval settings, before (re)starting the workers.
+#
+#   cd backend-rag && python -m scripts.build_bundle
+import time
+from app.ingestion.bundle import build_bundle
+
+
+def main():
+    start = time.perf_counter()
+    path = build_bundle()
+    print(f"bundle written to {path} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# Index build time, query latency and recall@k of the lexical retriever on a
+# small labelled query set over the bundled corpus, comparing the analyzer
+# pipeline against plain str.split tokenization.
+#
+#   cd backend-rag && python -m scripts.eval_lexical
+import time
+from app.ingestion.corpus import get_corpus
+from app.retrieval.bm25 import BM25Index
+from app.retrieval.analyzer import Analyzer
+
+# query -> ids of the documents that answer it
+LABELLED_QUERIES = {
+    "what is nav": ["faq_2"],
+    "net asset value of a fund": ["faq_2"],
+    "explain sip": ["faq_3"],
+    "systematic investment plans": ["faq_3"],
+    "what does cagr mean": ["faq_4"],
+    "compounded annual growth": ["faq_4"],
+    "how risky are mutual funds": ["faq_5", "faq_9"],
+    "what is the sharpe ratio?": ["faq_8"],
+    "risk-adjusted returns": ["faq_8"],
+    "are returns guaranteed": ["faq_9"],
+    "balanced funds": ["faq_6", "F004"],
+    "index funds tracking nifty": ["faq_1", "F006"],
+    "how to choose a fund": ["faq_7"],
+    "small cap equity": ["F003"],
+    "debt fund bonds": ["F008", "F010"],
+    "tax saver elss": ["F009"],
+    "parag parikh flexi cap": ["F007"],
+    "hdfc top 100": ["F002"],
+}
+
+
+def evaluate(name, tokenize, corpus, k=3):
+    start = time.perf_counter()
+    index = BM25Index.build([tokenize(t) for t in corpus.texts])
+    build_ms = (time.perf_counter() - start) * 1000
+
+    hits = total = 0
+    start = time.perf_counter()
+    for query, relevant in LABELLED_QUERIES.items():
+        idxs, _ = index.search(tokenize(query), k)
+        found = {corpus.ids[i] for i in idxs}
+        hits += len(found & set(relevant))
+        total += min(len(relevant), k)
+    query_us = (time.perf_counter() - start) * 1e6 / len(LABELLED_QUERIES)
+    print(f"{name:<10} {build_ms:>9.2f} {query_us:>10.1f} {hits / total:>10.3f}")
+
+
+def main(k: int = 3):
+    corpus = get_corpus()
+    print(f"{len(LABELLED_QUERIES)} labelled queries, {len(corpus)} docs")
+    print(f"{'tokenizer':<10} {'build ms':>9} {'us/query':>10} {f'recall@{k}':>10}")
+    evaluate("str.split", str.split, corpus, k)
+    evaluate("analyzer", Analyzer(), corpus, k)
+
+
+if __name__ == "__main__":
+    main()
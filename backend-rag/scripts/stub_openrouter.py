@@ -0,0 +1,103 @@
+# Local stand-in for OpenRouter's /chat/completions that injects latency and
+# failures, for exercising the LLM transport (retries, Retry-After, hedging,
+# circuit breaker, fallback models) without spending tokens. Answers both
+# plain and streamed requests and reports usage like OpenRouter does.
+#
+#   cd backend-rag && python -m scripts.stub_openrouter --port 8081 --error-rate 0.2 --slow-rate 0.05
+#   OPENROUTER_BASE_URL=http://localhost:8081/api/v1 OPENROUTER_API_KEY=stub uvicorn app.main:app
+#
+# --down-models takes a comma-separated list of models that always answer 503,
+# e.g. the routed model, to watch the breaker open and the fallback take over.
+import argparse
+import asyncio
+import json
+import random
+import time
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="OpenRouter stub")
+config = argparse.Namespace()
+stats = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0, "slow": 0}
+
+
+def _usage(prompt_chars: int) -> dict:
+    prompt = prompt_chars // 4
+    return {
+        "prompt_tokens": prompt,
+        "completion_tokens": config.tokens,
+        "prompt_tokens_details": {"cached_tokens": min(prompt, 1024)},
+        "completion_tokens_details": {"reasoning_tokens": config.tokens // 2},
+        "cost": 0.0,
+    }
+
+
+def _failure(model: str):
+    if model in config.down_models or random.random() < config.error_rate:
+        stats["errors"] += 1
+        return JSONResponse({"error": {"code": 503, "message": "stub: provider unavailable"}}, status_code=503)
+    if random.random() < config.rate_limit_rate:
+        stats["rate_limited"] += 1
+        return JSONResponse({"error": {"code": 429, "message": "stub: rate limited"}}, status_code=429,
+                            headers={"Retry-After": str(config.retry_after)})
+    return None
+
+
+async def _delay():
+    latency = config.latency
+    if random.random() < config.slow_rate:
+        stats["slow"] += 1
+        latency = config.slow_latency
+    await asyncio.sleep(random.uniform(0.5, 1.5) * latency)
+
+
+@app.post("/api/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "")
+    stats["requests"] += 1
+    await _delay()
+    failure = _failure(model)
+    if failure is not None:
+        return failure
+
+    stats["ok"] += 1
+    prompt_chars = sum(len(json.dumps(m.get("content"))) for m in body.get("messages", []))
+    answer = f"stub answer from {model} at {time.strftime('%H:%M:%S')}"
+    if not body.get("stream"):
+        return {"model": model, "choices": [{"message": {"role": "assistant", "content": answer}}],
+                "usage": _usage(prompt_chars)}
+
+    async def events():
+        for word in answer.split(" "):
+            yield f"data: {json.dumps({'choices': [{'delta': {'content': word + ' '}}]})}\n\n"
+            await asyncio.sleep(0.01)
+        yield f"data: {json.dumps({'choices': [], 'usage': _usage(prompt_chars)})}\n\n"
+        yield "data: [DONE]\n\n"
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.3, help="typical response time, seconds")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of requests that take --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--down-models", default="", help="comma-separated models that always answer 503")
+    parser.add_argument("--tokens", type=int, default=200, help="completion tokens reported per answer")
+    args = parser.parse_args(namespace=config)
+    config.down_models = {m for m in args.down_models.split(",") if m}
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
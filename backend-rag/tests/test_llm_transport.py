@@ -0,0 +1,150 @@
+# Circuit breaker half-open probes that end without a normal outcome.
+#
+#   cd backend-rag && python -m pytest -q tests
+import asyncio
+import time
+import httpx
+import pytest
+from app.core import llm_transport
+
+
+def _half_open(model: str) -> llm_transport.CircuitBreaker:
+    breaker = llm_transport._breaker(model)
+    breaker.is_open = True
+    breaker.opened_at = time.monotonic() - breaker.cooldown - 1
+    return breaker
+
+
+def _client(handler) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://stub")
+
+
+def test_client_error_probe_closes_circuit():
+    breaker = _half_open("test/probe-400")
+
+    async def bad_request(request):
+        return httpx.Response(400, json={"error": "bad request"})
+
+    async def ok(request):
+        return httpx.Response(200, json={"choices": []})
+
+    async def run():
+        with pytest.raises(RuntimeError, match="400"):
+            await llm_transport.complete(_client(bad_request), {}, ["test/probe-400"])
+        assert not breaker.is_open and not breaker.probing
+        assert await llm_transport.complete(_client(ok), {}, ["test/probe-400"]) == {"choices": []}
+
+    asyncio.run(run())
+
+
+def test_client_error_stream_probe_closes_circuit():
+    breaker = _half_open("test/stream-400")
+
+    async def bad_request(request):
+        return httpx.Response(400, json={"error": "bad request"})
+
+    async def run():
+        with pytest.raises(RuntimeError, match="400"):
+            async with llm_transport.stream(_client(bad_request), {}, ["test/stream-400"]):
+                pass
+        assert not breaker.is_open and breaker.allow()
+
+    asyncio.run(run())
+
+
+def test_cancelled_probe_releases_circuit():
+    breaker = _half_open("test/probe-cancel")
+
+    async def slow(request):
+        await asyncio.sleep(10)
+        return httpx.Response(200, json={})
+
+    async def run():
+        task = asyncio.create_task(llm_transport.complete(_client(slow), {}, ["test/probe-cancel"]))
+        await asyncio.sleep(0.05)
+        assert breaker.probing
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert not breaker.probing
+        assert breaker.allow()  # the next request gets to probe
+
+    asyncio.run(run())
+
+
+def test_cancelled_stream_probe_releases_circuit():
+    breaker = _half_open("test/stream-cancel")
+
+    async def slow(request):
+        await asyncio.sleep(10)
+        return httpx.Response(200, json={})
+
+    async def open_stream():
+        async with llm_transport.stream(_client(slow), {}, ["test/stream-cancel"]):
+            pass
+
+    async def run():
+        task = asyncio.create_task(open_stream())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert not breaker.probing and breaker.allow()
+
+    asyncio.run(run())
+
+
+def test_cancelled_request_keeps_others_probe():
+    breaker = llm_transport._breaker("test/bystander")
+    started = asyncio.Event()
+
+    async def slow(request):
+        started.set()
+        await asyncio.sleep(10)
+        return httpx.Response(200, json={})
+
+    async def run():
+        bystander = asyncio.create_task(llm_transport.complete(_client(slow), {}, ["test/bystander"]))
+        await started.wait()  # let through while the circuit was closed
+        _half_open("test/bystander")
+        probe = asyncio.create_task(llm_transport.complete(_client(slow), {}, ["test/bystander"]))
+        await asyncio.sleep(0.05)
+        assert breaker.probing
+        bystander.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await bystander
+        assert breaker.probing and not breaker.allow()  # still one probe in flight
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        assert breaker.allow()
+
+    asyncio.run(run())
+
+
+def test_cancel_before_hedge_cancels_request(monkeypatch):
+    monkeypatch.setattr(llm_transport, "LLM_HEDGE_ENABLED", True)
+    llm_transport._latencies.pop("hedge:test/hedge", None)
+    for _ in range(llm_transport.LLM_HEDGE_MIN_SAMPLES):
+        llm_transport._record_latency("hedge:test/hedge", 1.0)
+    upstream = []
+
+    async def slow(request):
+        upstream.append("open")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            upstream.append("cancelled")
+            raise
+        return httpx.Response(200, json={})
+
+    async def run():
+        task = asyncio.create_task(llm_transport.complete(_client(slow), {}, ["test/hedge"], key="hedge"))
+        await asyncio.sleep(0.05)  # waiting out the hedge delay
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+        assert upstream == ["open", "cancelled"]
+
+    asyncio.run(run())
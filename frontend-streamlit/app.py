@@ -9,6 +9,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 BACKEND_URL = os.getenv("BACKEND_URL_LINK")
+BACKEND_STREAM_URL = os.getenv("BACKEND_STREAM_URL_LINK") or (f"{BACKEND_URL.rstrip('/')}/stream" if BACKEND_URL else None)
 
 COOLDOWN_SECONDS = 30  
 
@@ -180,6 +181,13 @@ if "cooldown_until" not in st.session_state:
     st.session_state.cooldown_until = None
 
 
+def llm_unavailable_message(status, retry_after):
+    wait = f"in about {int(float(retry_after))} seconds" if retry_after else "in a little while"
+    if status == 429:
+        return f"OpenRouter is rate limiting requests right now. Please try again {wait}."
+    return f"The language model is temporarily unavailable. Please try again {wait}."
+
+
 def call_backend(query, mode):
     payload = {"query": query, "mode": mode}
     try:
@@ -187,14 +195,73 @@ def call_backend(query, mode):
     except Exception as e:
         return {"answer": f"❌ Could not reach backend: {e}"}
 
-    if resp.status_code == 500:
-        return {"answer": f"⚠️ OPENROUTER RATE LIMIT REACHED ({resp.status_code}): {resp.text}. \n Please try again after an hour, the model used is a free tier option from openrouter, thus it has limited rate limit. You can access this again after sometime. Thank You!"}
-    
+    if resp.status_code in (429, 503):
+        # the backend already retried and tried its fallback models
+        return {"answer": f"⚠️ {llm_unavailable_message(resp.status_code, resp.headers.get('Retry-After'))}"}
+
     if resp.status_code != 200:
         return {"answer": f"❌ Backend error ({resp.status_code}): {resp.text}"}
 
     return resp.json()
 
+def assistant_bubble(content):
+    return f"""
+        <div class='message-row assistant-message'>
+            <div class='message-content'>
+                <div style='display: flex;'>
+                    <div class='message-icon assistant-icon'>Q</div>
+                    <div style='flex: 1;'>{content}</div>
+                </div>
+            </div>
+        </div>
+        """
+
+
+def call_backend_stream(query, mode, placeholder):
+    # reads the /query/stream server-sent events and redraws the answer bubble
+    # as tokens arrive; returns the same shape as call_backend
+    payload = {"query": query, "mode": mode}
+    result = {"answer": "", "sources": [], "reasoning": None}
+    reasoning = ""
+    try:
+        resp = requests.post(BACKEND_STREAM_URL, json=payload, stream=True, timeout=(10, 120))
+    except Exception as e:
+        return {"answer": f"❌ Could not reach backend: {e}"}
+
+    if resp.status_code != 200:
+        return {"answer": f"❌ Backend error ({resp.status_code}): {resp.text}"}
+
+    placeholder.markdown(assistant_bubble("🔎 Sources found, writing answer…"), unsafe_allow_html=True)
+    event = None
+    for line in resp.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+            continue
+        if not line.startswith("data:"):
+            continue
+        data = json.loads(line[len("data:"):].strip())
+
+        if event == "sources":
+            result["sources"] = data
+        elif event == "reasoning":
+            reasoning += data["text"]
+        elif event == "token":
+            result["answer"] += data["text"]
+            placeholder.markdown(assistant_bubble(result["answer"] + " ▌"), unsafe_allow_html=True)
+        elif event == "error":
+            if data.get("status") in (429, 503):
+                result["answer"] += f"\n\n⚠️ {llm_unavailable_message(data['status'], data.get('retry_after'))}"
+            else:
+                result["answer"] += f"\n\n⚠️ OPENROUTER ERROR: {data.get('detail')}. Please try again after some time."
+        elif event == "done":
+            break
+
+    if reasoning:
+        result["reasoning"] = {"text": reasoning}
+    placeholder.markdown(assistant_bubble(result["answer"]), unsafe_allow_html=True)
+    return result
+
+
 def render_cooldown():
     COOLDOWN_MESSAGES = [
         "[1/6] A short buffer is intentionally added to avoid overwhelming the free-tier model…",
@@ -250,16 +317,7 @@ for i, msg in enumerate(st.session_state.messages):
         </div>
         """, unsafe_allow_html=True)
     else:
-        st.markdown(f"""
-        <div class='message-row assistant-message'>
-            <div class='message-content'>
-                <div style='display: flex;'>
-                    <div class='message-icon assistant-icon'>Q</div>
-                    <div style='flex: 1;'>{content}</div>
-                </div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(assistant_bubble(content), unsafe_allow_html=True)
 
         if msg.get("sources"):
             with st.expander(f"🗂 Sources Used (message #{i})", expanded=False):
@@ -312,8 +370,13 @@ else:
             "content": f"{user_input} (search mode: {mode})"
         })
 
-        with st.spinner("Analyzing Query.... Retrieving the best Source... Generating Response.."):
-            result = call_backend(user_input, mode)
+        if BACKEND_STREAM_URL:
+            answer_box = st.empty()
+            with st.spinner("Analyzing Query.... Retrieving the best Source..."):
+                result = call_backend_stream(user_input, mode, answer_box)
+        else:
+            with st.spinner("Analyzing Query.... Retrieving the best Source... Generating Response.."):
+                result = call_backend(user_input, mode)
 
         assistant_msg = {
             "role": "assistant",